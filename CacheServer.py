@@ -0,0 +1,21 @@
+from src.RemoteCache import makeServer
+
+import argparse
+
+def main():
+    parser = argparse.ArgumentParser(prog='python3 -m CacheServer', usage='%(prog)s [--dir DIR] <host:port OR unix:path>')
+    parser.add_argument('address', help=argparse.SUPPRESS)
+    parser.add_argument('--dir', help='keep entries in this directory instead of in memory')
+    args = parser.parse_args()
+
+    server = makeServer(args.address, args.dir)
+    print(f'Serving compilation cache on {args.address}')
+
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+
+main()
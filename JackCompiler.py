@@ -1,15 +1,71 @@
 from src.JackCompiler import JackCompiler
+from src.CompilerOptions import CompilerOptions
 
 import sys
 
 def main():
-    if len(sys.argv) != 2:
-        print('Usage: python3 -m JackCompiler <dirname OR filename.jack>')
-        return
+    # A source path without options, as on every editor save, skips building the argument parser
+    if len(sys.argv) == 2 and not sys.argv[1].startswith('-'):
+        options = CompilerOptions()
+        sourceFile = sys.argv[1]
+    else:
+        options, sourceFile = parseArgs()
 
-    sourceFile = sys.argv[1]
+    compiler = JackCompiler(options)
+    if compiler.compile(sourceFile):
+        sys.exit(1)
 
-    compiler = JackCompiler()
-    compiler.compile(sourceFile)
+def parseArgs(argv=None) -> tuple[CompilerOptions, str]:
+    # argv: arguments to parse instead of the command line, as in benchmarks.regression
+    import argparse
 
-main()
+    parser = argparse.ArgumentParser(prog='python3 -m JackCompiler', usage='%(prog)s [options] <dirname OR filename.jack OR archive>')
+    parser.add_argument('sourceFile', help=argparse.SUPPRESS)
+    parser.add_argument('--inline', action='store_true', help='expand calls to trivial getters and setters in place')
+    parser.add_argument('--optimize-arrays', action='store_true', help='fold constant subscripts and reuse array addresses')
+    parser.add_argument('--hoist', action='store_true', help='compute loop-invariant expressions once before while loops')
+    parser.add_argument('--constant-tables', action='store_true', help='fill arrays from runs of constant stores with one address load')
+    parser.add_argument('--optimize-conditions', action='store_true', help='branch on if and while conditions without computing their negation')
+    parser.add_argument('--check-calls', action='store_true', help='check that called subroutines exist and get the right arguments')
+    parser.add_argument('--stable-labels', action='store_true', help='number labels separately in each subroutine')
+    parser.add_argument('--cache', metavar='DIR', help='reuse the output of unchanged subroutines (implies --stable-labels)')
+    parser.add_argument('--binary', action='store_true', help='write binary .vmb files instead of text .vm files')
+    parser.add_argument('--pipeline', action='store_true', help='read and write files in background threads while compiling')
+    parser.add_argument('--pipeline-depth', metavar='N', type=int, default=4, help='files read ahead and written behind with --pipeline (default 4)')
+    parser.add_argument('--remote-cache', metavar='ADDRESS', help='fetch and store whole compiled files in a cache server at host:port or unix:path')
+    parser.add_argument('--stats', metavar='FILE', help='write code size and stack depth statistics per subroutine to FILE as JSON')
+    parser.add_argument('--stats-top', metavar='N', type=int, default=10, help='functions in the printed statistics table (default 10)')
+    parser.add_argument('--source-map', action='store_true', help='write the source line of each instruction to an <output>.map file')
+    parser.add_argument('--recursive', action='store_true', help='compile every directory with .jack files under the directory as its own project')
+    parser.add_argument('--jobs', metavar='N', type=int, help='projects compiled at once with --recursive (default one per CPU)')
+    parser.add_argument('--output-dir', metavar='DIR', help='write outputs into a tree under DIR that mirrors the sources')
+    args = parser.parse_args(argv)
+
+    # the remote cache fetches and compiles a whole batch of files itself, so it cannot also be pipelined
+    if args.remote_cache and args.pipeline:
+        parser.error('--pipeline cannot be combined with --remote-cache')
+
+    options = CompilerOptions(
+        inline=args.inline,
+        arrays=args.optimize_arrays,
+        hoist=args.hoist,
+        conditions=args.optimize_conditions,
+        tables=args.constant_tables,
+        checkCalls=args.check_calls,
+        stableLabels=args.stable_labels,
+        cacheDir=args.cache,
+        binary=args.binary,
+        pipeline=args.pipeline_depth if args.pipeline else 0,
+        remoteCache=args.remote_cache,
+        stats=args.stats,
+        statsTop=args.stats_top,
+        sourceMap=args.source_map,
+        recursive=args.recursive,
+        jobs=args.jobs,
+        outputDir=args.output_dir
+    )
+
+    return options, args.sourceFile
+
+if __name__ == '__main__':    # worker processes of recursive builds may import this module
+    main()
@@ -0,0 +1,17 @@
+from src.VMBytecode import toText, toBinary
+
+import sys
+
+def main():
+    if len(sys.argv) != 3 or not sys.argv[2].endswith(('.vm', '.vmb')):
+        print('Usage: python3 -m VMConverter <infile> <outfile.vm OR outfile.vmb>')
+        return
+
+    infile, outfile = sys.argv[1:]
+
+    if outfile.endswith('.vmb'):
+        toBinary(infile, outfile)
+    else:
+        toText(infile, outfile)
+
+main()
@@ -0,0 +1,32 @@
+from src.SourceMap import SourceMap, readCounts
+
+import argparse
+import os
+
+def main():
+    parser = argparse.ArgumentParser(prog='python3 -m VMProfile', usage='%(prog)s [options] <file.vm OR file.vmb> <counts>')
+    parser.add_argument('vmFile', help=argparse.SUPPRESS)
+    parser.add_argument('counts', help=argparse.SUPPRESS)
+    parser.add_argument('--top', metavar='N', type=int, default=20, help='source lines in the table (default 20)')
+    parser.add_argument('--annotate', action='store_true', help='print the whole source with the count of each line instead')
+    args = parser.parse_args()
+
+    mapfile = f'{args.vmFile}.map'
+    sourceMap = SourceMap.read(mapfile)
+    lineCounts = sourceMap.profile(readCounts(args.counts))
+    total = sum(lineCounts.values()) or 1
+
+    with open(os.path.join(os.path.dirname(mapfile), sourceMap.source)) as infile:
+        sourceLines = infile.read().splitlines()
+
+    if args.annotate:
+        for line, text in enumerate(sourceLines, 1):
+            count = lineCounts.get(line)
+            print(f'{count if count else '':>10} | {text}')
+        return
+
+    print(f'{'count':>10} {'%':>6} {'line':>5}  source')
+    for line, count in lineCounts.most_common(args.top):
+        print(f'{count:>10} {100 * count / total:>6.2f} {line:>5}  {sourceLines[line - 1].strip()}')
+
+main()
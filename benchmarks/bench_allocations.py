@@ -0,0 +1,79 @@
+# Memory allocated while compiling a directory of many small classes, with a new engine per file
+# and with one engine reused for all files.
+# Run from the project directory: python3 -m benchmarks.bench_allocations [classes]
+
+from src.CompilationEngine import CompilationEngine
+
+import os
+import sys
+import tempfile
+import time
+import tracemalloc
+
+CLASS_SOURCE = '''class C{0} {{
+    field int x, y;
+
+    constructor C{0} new(int ax, int ay) {{
+        let x = ax;
+        let y = ay;
+        return this;
+    }}
+
+    method int sum(int n) {{
+        var int i, total;
+        let i = 0;
+        while (i < n) {{
+            if (i > x) {{ let total = total + y; }} else {{ let total = total - 1; }}
+            let i = i + 1;
+        }}
+        return total;
+    }}
+}}
+'''
+
+def measure(files: list[str], compileAll) -> tuple[float, float]:
+    # Time per file in ms, and the mean of the memory each file allocates on top of what is live before it, in KiB.
+    # compileAll compiles one file per step.
+
+    tracemalloc.start()
+    start = time.perf_counter()
+    steps = iter(compileAll())
+    total = 0
+
+    for _ in files:
+        before, _ = tracemalloc.get_traced_memory()
+        tracemalloc.reset_peak()
+        next(steps)
+        _, peak = tracemalloc.get_traced_memory()
+        total += peak - before
+
+    elapsed = time.perf_counter() - start
+    tracemalloc.stop()
+
+    return elapsed / len(files) * 1e3, total / len(files) / 1024
+
+def main():
+    nClasses = int(sys.argv[1]) if len(sys.argv) > 1 else 2000
+
+    with tempfile.TemporaryDirectory() as tmpdir:
+        files = []
+        for i in range(nClasses):
+            files.append(os.path.join(tmpdir, f'C{i}.jack'))
+            with open(files[-1], 'w') as outfile:
+                outfile.write(CLASS_SOURCE.format(i))
+
+        def freshEngines():
+            for infile in files:
+                yield CompilationEngine(infile, f'{infile[:-5]}.vm', None)
+
+        def reusedEngine():
+            engine = CompilationEngine(None, None, None)
+            for infile in files:
+                engine.compileFile(infile, f'{infile[:-5]}.vm')
+                yield engine
+
+        for name, compileAll in (('new engine per file', freshEngines), ('one reused engine', reusedEngine)):
+            timeMs, peakKiB = measure(files, compileAll)
+            print(f'{name:<20} {timeMs:7.3f} ms/file (traced)  {peakKiB:7.1f} KiB peak allocation per file')
+
+main()
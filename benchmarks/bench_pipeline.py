@@ -0,0 +1,48 @@
+# Compares compiling a directory file by file with the pipelined driver.
+# Run from the project directory: python3 -m benchmarks.bench_pipeline [dirname] [copies] [latency ms]
+# A latency above 0 adds that delay to every file open, to stand in for a network-mounted directory.
+
+from src.JackCompiler import JackCompiler
+from src.CompilerOptions import CompilerOptions
+
+import builtins
+import glob
+import os
+import shutil
+import sys
+import tempfile
+import time
+
+def main():
+    sourceDir = sys.argv[1] if len(sys.argv) > 1 else 'test/Pong'
+    copies = int(sys.argv[2]) if len(sys.argv) > 2 else 20
+    latency = float(sys.argv[3]) / 1e3 if len(sys.argv) > 3 else 0.0
+
+    realOpen = builtins.open
+
+    def slowOpen(*args, **kwargs):
+        time.sleep(latency)
+        return realOpen(*args, **kwargs)
+
+    with tempfile.TemporaryDirectory() as tmpdir:
+        for copy in range(copies):
+            for sourceFile in glob.glob(f'{sourceDir}/*.jack'):
+                shutil.copy(sourceFile, os.path.join(tmpdir, f'{copy}{os.path.basename(sourceFile)}'))
+
+        builtins.open = slowOpen
+        try:
+            start = time.perf_counter()
+            JackCompiler().compile(tmpdir)
+            serial = time.perf_counter() - start
+
+            start = time.perf_counter()
+            JackCompiler(CompilerOptions(pipeline=4)).compile(tmpdir)
+            pipelined = time.perf_counter() - start
+        finally:
+            builtins.open = realOpen
+
+    print(f'{copies} copies of {sourceDir}, {latency * 1e3:.1f} ms per open')
+    print(f'serial:    {serial:8.3f} s')
+    print(f'pipelined: {pipelined:8.3f} s')
+
+main()
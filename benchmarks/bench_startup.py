@@ -0,0 +1,50 @@
+# Cold start time of the compiler on a one-line file, the cost paid on every editor save.
+# Run from the project directory: python3 -m benchmarks.bench_startup [runs]
+# Reports the time over a bare interpreter start and fails if it is above the target.
+
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+TARGET_MS = 10.0    # compiler overhead over `python3 -c pass`
+
+def timeRuns(args: list[str], runs: int, env: dict) -> list[float]:
+    times = []
+
+    for _ in range(runs):
+        start = time.perf_counter()
+        subprocess.run(args, env=env, check=True)
+        times.append((time.perf_counter() - start) * 1e3)
+
+    return times
+
+def main():
+    runs = int(sys.argv[1]) if len(sys.argv) > 1 else 20
+
+    # measure as installed, with cached bytecode
+    env = {name: val for name, val in os.environ.items() if name != 'PYTHONDONTWRITEBYTECODE'}
+
+    with tempfile.TemporaryDirectory() as tmpdir:
+        sourceFile = os.path.join(tmpdir, 'One.jack')
+        with open(sourceFile, 'w') as outfile:
+            outfile.write('class One { function void f() { return; } }\n')
+
+        compileArgs = [sys.executable, '-m', 'JackCompiler', sourceFile]
+        timeRuns(compileArgs, 2, env)   # writes the bytecode caches
+
+        baseline = timeRuns([sys.executable, '-c', 'pass'], runs, env)
+        compiler = timeRuns(compileArgs, runs, env)
+
+    overhead = statistics.median(compiler) - statistics.median(baseline)
+
+    print(f'interpreter: {statistics.median(baseline):7.1f} ms median, {min(baseline):7.1f} ms min')
+    print(f'compiler:    {statistics.median(compiler):7.1f} ms median, {min(compiler):7.1f} ms min')
+    print(f'overhead:    {overhead:7.1f} ms (target {TARGET_MS:.0f} ms)')
+
+    if overhead > TARGET_MS:
+        sys.exit(1)
+
+main()
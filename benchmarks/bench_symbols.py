@@ -0,0 +1,41 @@
+# Micro-benchmark for identifier resolution on identifier-heavy code.
+# Run from the project directory: python3 -m benchmarks.bench_symbols [filename.jack]
+
+from src.CompilationEngine import CompilationEngine
+from src.JackTokenizer import JackTokenizer
+from src.CompilerResources import TYPE
+
+import os
+import sys
+import tempfile
+import timeit
+
+def main():
+    sourceFile = sys.argv[1] if len(sys.argv) > 1 else 'test/Pong/Ball.jack'
+
+    with tempfile.TemporaryDirectory() as tmpdir:
+        outfile = os.path.join(tmpdir, 'out.vm')
+
+        compileTime = min(timeit.repeat(lambda: CompilationEngine(sourceFile, outfile, None), number=20, repeat=5)) / 20
+
+        # The engine keeps the symbol tables of the class and its last subroutine after compiling
+        engine = CompilationEngine(sourceFile, outfile, None)
+
+    tokenizer = JackTokenizer(sourceFile)
+    names = []
+    while tokenizer.hasMoreTokens():
+        token = tokenizer.advance()
+        if token.type is TYPE.IDENTIFIER and engine.methodSymbolTable.lookup(token.val) is not None:
+            names.append(token.val)
+
+    def resolveAll():
+        for name in names:
+            engine._compileSymbolUse(name)
+
+    lookupTime = min(timeit.repeat(resolveAll, number=200, repeat=5)) / (200 * len(names))
+
+    print(f'{sourceFile}: {len(names)} variable uses')
+    print(f'compile:  {compileTime * 1e3:8.3f} ms per file')
+    print(f'resolve:  {lookupTime * 1e9:8.1f} ns per variable use')
+
+main()
@@ -0,0 +1,204 @@
+# Golden output, behaviour and performance regression check over the test/ projects and benchmarks/cases/.
+# Run from the project directory: python3 -m benchmarks.regression [options]
+# Compiles each project into a scratch directory once per set of compiler flags, compares the outputs of the
+# default code generation with the checked-in .vm files, and runs the outputs of other code generation in the
+# VM simulator to compare their behaviour with the default build. Then records compile time and instruction
+# count per flag set and project, and compares them with an earlier results file.
+
+from src.CompilerOptions import CompilerOptions
+from src.JackCompiler import JackCompiler
+from src.VMBytecode import readFile
+from src.VMWriter import formatInstruction
+from JackCompiler import parseArgs as parseCompilerArgs
+from benchmarks.simulator import runProject, sameBehaviour, firstDifference
+
+import argparse
+import contextlib
+import glob
+import io
+import json
+import os
+import shlex
+import shutil
+import sys
+import tempfile
+import time
+
+TEST_DIR = 'test'
+CASES_DIR = 'benchmarks/cases'  # small programs for the rules optimizations must keep, without checked-in outputs
+KEYS = [3, 131, 133, 132, 130, 0, 0, 132, 81, 140]  # Keyboard input of every simulated run
+
+# flag sets run without --flags: the default code generation, each optimization alone, and all of them
+DEFAULT_FLAGS = ['', '--inline', '--optimize-arrays', '--hoist', '--optimize-conditions', '--constant-tables',
+                 '--inline --optimize-arrays --hoist --optimize-conditions --constant-tables']
+MIN_TIME_DELTA_MS = 1.0     # smaller slowdowns are timer noise, whatever the threshold
+
+def normalize(text: str) -> list[str]:
+    # Instructions without layout, with labels renumbered in order of appearance in each function,
+    # so that outputs differing only in label numbering compare equal
+    lines = []
+    labels = {}
+
+    for line in text.splitlines():
+        if not (words := line.split()):
+            continue
+
+        if words[0] == 'function':
+            labels = {}
+        elif words[0] in ('label', 'goto', 'if-goto'):
+            words[1] = labels.setdefault(words[1], f'L{len(labels)}')
+
+        lines.append(' '.join(words))
+
+    return lines
+
+def countInstructions(text: str) -> int:
+    return sum(1 for line in text.splitlines() if line.split() and line.split()[0] not in ('label', 'function'))
+
+def compileProject(project: str, scratch: str, runs: int, options: CompilerOptions) -> tuple[float, dict[str, str], list]:
+    # Best compile time of the project in ms, its outputs by file name, and its compile errors
+
+    workDir = os.path.join(scratch, os.path.basename(project))
+    shutil.copytree(project, workDir, ignore=shutil.ignore_patterns('*.vm'))
+    compiler = JackCompiler(options)
+    times = []
+
+    for _ in range(runs):
+        start = time.perf_counter()
+        with contextlib.redirect_stdout(io.StringIO()), contextlib.redirect_stderr(io.StringIO()):
+            diagnostics = compiler.compile(workDir)
+        times.append((time.perf_counter() - start) * 1e3)
+
+    outputs = {}
+    for outfile in sorted(glob.glob(f'{workDir}/*.vm')):
+        with open(outfile) as infile:
+            outputs[os.path.basename(outfile)] = infile.read()
+
+    for outfile in sorted(glob.glob(f'{workDir}/*.vmb')):    # as text, to compare with the checked-in files
+        outputs[f'{os.path.basename(outfile)[:-1]}'] = ''.join(f'{formatInstruction(instruction)}\n' for instruction in readFile(outfile))
+
+    return min(times), outputs, diagnostics
+
+def compareGolden(project: str, outputs: dict[str, str], normalized: bool) -> list[str]:
+    # Names of the files whose output does not match the checked-in .vm file
+    mismatches = []
+
+    for golden in sorted(glob.glob(f'{project}/*.vm')):
+        with open(golden) as infile:
+            expected = infile.read()
+
+        actual = outputs.get(os.path.basename(golden))
+        if actual is None or (normalize(actual) != normalize(expected) if normalized else actual != expected):
+            mismatches.append(os.path.basename(golden))
+
+    return mismatches
+
+def compareBaseline(results: dict, baseline: dict, timeThreshold: float, sizeThreshold: float) -> list[str]:
+    regressions = []
+
+    for flags, projects in results.items():
+        for name, result in projects.items():
+            if (before := baseline.get(flags, {}).get(name)) is not None:
+                regressions += [f'[{flags}] {regression}' for regression in
+                                compareResult(name, result, before, timeThreshold, sizeThreshold)]
+
+    return regressions
+
+def compareResult(name: str, result: dict, before: dict, timeThreshold: float, sizeThreshold: float) -> list[str]:
+    regressions = []
+
+    slowdown = result['timeMs'] - before['timeMs']
+    if slowdown > MIN_TIME_DELTA_MS and result['timeMs'] > before['timeMs'] * (1 + timeThreshold):
+        regressions.append(f'{name}: compile time {before['timeMs']:.1f} -> {result['timeMs']:.1f} ms')
+
+    if result['instructions'] > before['instructions'] * (1 + sizeThreshold):
+        regressions.append(f'{name}: instructions {before['instructions']} -> {result['instructions']}')
+
+    return regressions
+
+def parseArgs():
+    parser = argparse.ArgumentParser(prog='python3 -m benchmarks.regression',
+                                     description='Compare test/ outputs with the checked-in .vm files and track compile time and size')
+    parser.add_argument('--flags', metavar='FLAGS', action='append',
+                        help='compiler flags of a configuration to run, e.g. --flags="--optimize-arrays --hoist"; '
+                             'may be given several times (default: the default options, each optimization alone, and all of them)')
+    parser.add_argument('--runs', type=int, default=5, help='compilations per project, the fastest is recorded (default 5)')
+    parser.add_argument('--normalize', action='store_true', help='ignore layout and label numbering when comparing outputs')
+    parser.add_argument('--results', metavar='FILE', default='regression_results.json', help='where to write the results (default regression_results.json)')
+    parser.add_argument('--baseline', metavar='FILE', help='results of an earlier run to compare with')
+    parser.add_argument('--time-threshold', metavar='FRACTION', type=float, default=0.2, help='allowed compile time increase (default 0.2)')
+    parser.add_argument('--size-threshold', metavar='FRACTION', type=float, default=0.0, help='allowed instruction count increase (default 0)')
+    return parser.parse_args()
+
+def runConfiguration(flags: str, projects: list[str], args, scratch: str, failures: list, reference: dict) -> dict:
+    # Results of one flag set by project. Outputs are compared with the checked-in files when the flags leave
+    # code generation as it is by default. Optimizations legitimately change it, so their outputs are run
+    # and compared by behaviour with the default build instead.
+    # scratch: directory of its own for the outputs
+    # reference: simulated run of the default build of each project
+
+    options, _ = parseCompilerArgs([*shlex.split(flags), TEST_DIR])
+    checkGolden = options.codegenKey() == CompilerOptions().codegenKey()
+    results = {}
+
+    print(f'[{flags or 'default options'}]')
+
+    for project in projects:
+        name = os.path.basename(project)
+        timeMs, outputs, diagnostics = compileProject(project, scratch, args.runs, options)
+        mismatches = compareGolden(project, outputs, args.normalize) if checkGolden else []
+        same = None
+
+        if not checkGolden:
+            run = runProject(outputs, KEYS)
+            if not (same := sameBehaviour(reference[name], run)):
+                failures.append(f'[{flags}] {name}: behaves differently from the default build, {firstDifference(reference[name], run)}')
+
+        results[name] = {
+            'timeMs': round(timeMs, 3),
+            'instructions': sum(countInstructions(text) for text in outputs.values()),
+            'golden': not mismatches if checkGolden else None,
+            'behaviour': same,
+            'errors': len(diagnostics)
+        }
+        failures += [f'[{flags}] {name}: {diagnostic}' for diagnostic in diagnostics]
+        failures += [f'[{flags}] {name}: {file} differs from the checked-in output' for file in mismatches]
+
+        status = ('ok' if not mismatches else 'MISMATCH') if checkGolden else ('same behaviour' if same else 'BEHAVIOUR DIFFERS')
+        if diagnostics:
+            status = f'{len(diagnostics)} ERROR(S)'
+        print(f'{name:<16} {timeMs:8.2f} ms {results[name]['instructions']:7} instrs  {status}')
+
+    return results
+
+def main():
+    args = parseArgs()
+    projects = [path for directory in (TEST_DIR, CASES_DIR) for path in sorted(glob.glob(f'{directory}/*')) if os.path.isdir(path)]
+    results = {}    # flags -> project -> result
+    failures = []
+    reference = {}
+
+    with tempfile.TemporaryDirectory() as scratch:
+        # the default build to compare behaviour with, which also warms up imports and first-use caches
+        for project in projects:
+            _, outputs, diagnostics = compileProject(project, os.path.join(scratch, 'reference'), 1, CompilerOptions())
+            reference[os.path.basename(project)] = runProject(outputs, KEYS)
+            failures += [f'[default build] {os.path.basename(project)}: {diagnostic}' for diagnostic in diagnostics]
+
+        for i, flags in enumerate(args.flags or DEFAULT_FLAGS):
+            results[flags] = runConfiguration(flags, projects, args, os.path.join(scratch, f'flags{i}'), failures, reference)
+
+    if args.baseline:
+        with open(args.baseline) as infile:
+            failures += compareBaseline(results, json.load(infile), args.time_threshold, args.size_threshold)
+
+    with open(args.results, 'w') as outfile:
+        json.dump(results, outfile, indent=2, sort_keys=True)
+
+    for failure in failures:
+        print(failure, file=sys.stderr)
+
+    if failures:
+        sys.exit(1)
+
+main()
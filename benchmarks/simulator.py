@@ -0,0 +1,369 @@
+# Runs the VM code of a compiled project with a model of the Jack OS, and records the calls that interact with
+# the outside: Output, Screen, Keyboard, Sys and Memory.poke. Two builds of the same program, e.g. with and without an
+# optimization, behave the same when they make the same calls with the same arguments.
+# Used by benchmarks.regression; a project can also be run on its own:
+#   python3 -m benchmarks.simulator <dirname>
+
+from src.VMWriter import parseInstruction, stripComment
+
+import glob
+import os
+import re
+import sys
+from typing import NamedTuple
+
+RAM_SIZE = 32768
+HEAP_BASE = 2048
+STACK_BASE = 256
+STATIC_BASE = 16
+
+NEWLINE, BACKSPACE, DOUBLE_QUOTE = 128, 129, 34
+
+# Outside interactions that are recorded. Other Math, Memory, Array and String calls are computed but not recorded.
+TRACED_CLASSES = {'Output', 'Screen', 'Keyboard', 'Sys'}
+TRACED_FUNCTIONS = {'Memory.poke'}     # writes to memory-mapped I/O, or results left in RAM
+
+class VMError(Exception):
+    '''A fault of the program being run, such as an access outside the RAM or a division by zero'''
+
+
+class Run(NamedTuple):
+    status: str     # 'return', 'halt', 'error' (Sys.error), 'steps' or 'outputs' (limits), or 'fault: <message>'
+    trace: list     # (OS function, arguments) of each traced call, with the text of printed strings
+    steps: int
+
+
+def toWord(val: int) -> int:
+    # Wraps to a signed 16 bit value, as in the Hack RAM
+    val &= 0xFFFF
+    return val - 0x10000 if val & 0x8000 else val
+
+def sameBehaviour(expected: Run, actual: Run) -> bool:
+    # A run stopped by the step limit only shows a prefix of the behaviour. When the expected run was stopped,
+    # the actual run may have got further, as optimized code does in the same number of steps. An actual run
+    # stopped where the expected one finished, e.g. in a loop that no longer ends, differs.
+
+    if expected.status == 'steps':
+        shorter, longer = sorted((expected.trace, actual.trace), key=len)
+        return longer[:len(shorter)] == shorter
+
+    return expected.status == actual.status and expected.trace == actual.trace
+
+def firstDifference(expected: Run, actual: Run) -> str:
+    for i, (want, got) in enumerate(zip(expected.trace, actual.trace)):
+        if want != got:
+            return f'call {i}: expected {want}, got {got}'
+
+    return f'expected {len(expected.trace)} call(s) then {expected.status}, got {len(actual.trace)} then {actual.status}'
+
+
+class VMSimulator:
+    '''Executes the functions of a set of VM files on a model of the Hack RAM. The OS classes are implemented in Python,
+    calls to them do not touch the stack frames of the program.'''
+
+    def __init__(self, sources: dict[str, str], keys=(), maxSteps=1_000_000, maxOutputs=5000):
+        # sources: text of each VM file by file name
+        # keys: values returned one by one by Keyboard.keyPressed and readInt, then 0
+
+        self.code = []          # (command, arg, arg, class name), jump targets resolved to code indices
+        self.functions = {}     # name -> code index
+        self.staticBase = {}    # class name -> RAM address of static 0
+
+        self._load(sources)
+
+        self.ram = [0] * RAM_SIZE
+        self.heap = HEAP_BASE
+        self.strings = {}       # address -> characters of a String object
+        self.keys = list(keys)
+        self.trace = []
+        self.steps = 0
+        self.maxSteps = maxSteps
+        self.maxOutputs = maxOutputs
+
+    def _load(self, sources: dict[str, str]):
+        nextStatic = STATIC_BASE
+        labels = {}
+        jumps = []
+
+        for fileName in sorted(sources):
+            className = os.path.splitext(os.path.basename(fileName))[0]
+            nStatics = 0
+            function = None
+
+            for line in sources[fileName].splitlines():
+                if not stripComment(line):
+                    continue
+
+                command, *args = parseInstruction(line)
+
+                if command == 'function':
+                    function = args[0]
+                    self.functions[function] = len(self.code)
+                elif command == 'label':
+                    labels[function, args[0]] = len(self.code)
+                elif command in ('goto', 'if-goto'):
+                    jumps.append((len(self.code), function, args[0]))
+                elif command in ('push', 'pop') and args[0] == 'static':
+                    nStatics = max(nStatics, args[1] + 1)
+
+                self.code.append((command, *args, className))
+
+            self.staticBase[className] = nextStatic
+            nextStatic += nStatics
+
+        for index, function, label in jumps:
+            if (function, label) not in labels:
+                raise VMError(f'{function} jumps to undefined label {label}')
+            command, _, className = self.code[index]
+            self.code[index] = (command, labels[function, label], className)
+
+    def run(self, entry='Main.main') -> Run:
+        try:
+            status = self._execute(entry)
+        except VMError as error:
+            status = f'fault: {error}'
+
+        return Run(status, self.trace, self.steps)
+
+    def _address(self, segment: str, index: int, className: str) -> int:
+        ram = self.ram
+
+        match segment:
+            case 'local': address = ram[1] + index
+            case 'argument': address = ram[2] + index
+            case 'this': address = ram[3] + index
+            case 'that': address = ram[4] + index
+            case 'pointer': address = 3 + index
+            case 'temp': address = 5 + index
+            case 'static': address = self.staticBase[className] + index
+            case _: raise VMError(f'unknown segment {segment}')
+
+        if not 0 <= address < RAM_SIZE:
+            raise VMError(f'{segment} {index} is outside the RAM, at {address}')
+
+        return address
+
+    def _execute(self, entry: str) -> str:
+        if entry not in self.functions:
+            raise VMError(f'no function {entry}')
+
+        ram = self.ram
+        code = self.code
+        ram[0] = STACK_BASE
+
+        # a frame whose return address is -1, so the return of entry ends the run
+        for val in (-1, 0, 0, 0, 0):
+            ram[ram[0]] = val
+            ram[0] += 1
+        ram[1] = ram[0]
+        ram[2] = ram[0] - 5
+
+        pc = self.functions[entry]
+        self.steps = 0
+
+        while True:
+            self.steps += 1
+            if self.steps > self.maxSteps:
+                return 'steps'
+
+            command, *args, className = code[pc]
+            pc += 1
+
+            if command == 'push':
+                val = args[1] if args[0] == 'constant' else ram[self._address(*args, className)]
+                ram[ram[0]] = val
+                ram[0] += 1
+
+            elif command == 'pop':
+                ram[0] -= 1
+                ram[self._address(*args, className)] = ram[ram[0]]
+
+            elif command in ('add', 'sub', 'and', 'or', 'eq', 'gt', 'lt'):
+                ram[0] -= 1
+                y, x = ram[ram[0]], ram[ram[0] - 1]
+
+                match command:
+                    case 'add': val = x + y
+                    case 'sub': val = x - y
+                    case 'and': val = x & y
+                    case 'or': val = x | y
+                    case 'eq': val = -(x == y)
+                    case 'gt': val = -(x > y)
+                    case 'lt': val = -(x < y)
+
+                ram[ram[0] - 1] = toWord(val)
+
+            elif command == 'neg':
+                ram[ram[0] - 1] = toWord(-ram[ram[0] - 1])
+
+            elif command == 'not':
+                ram[ram[0] - 1] = ~ram[ram[0] - 1]
+
+            elif command == 'goto':
+                pc = args[0]
+
+            elif command == 'if-goto':
+                ram[0] -= 1
+                if ram[ram[0]] != 0:
+                    pc = args[0]
+
+            elif command == 'function':
+                for _ in range(args[1]):
+                    ram[ram[0]] = 0
+                    ram[0] += 1
+
+            elif command == 'call':
+                name, nArgs = args
+
+                if name in self.functions:
+                    for val in (pc, ram[1], ram[2], ram[3], ram[4]):
+                        ram[ram[0]] = val
+                        ram[0] += 1
+                    ram[2] = ram[0] - 5 - nArgs
+                    ram[1] = ram[0]
+                    pc = self.functions[name]
+                else:
+                    ram[0] -= nArgs
+                    callArgs = ram[ram[0]:ram[0] + nArgs]
+
+                    if (stop := self._callOS(name, callArgs)) is not None:
+                        return stop
+
+                    ram[ram[0]] = toWord(self.result)
+                    ram[0] += 1
+
+            elif command == 'return':
+                frame = ram[1]
+                returnAddress = ram[frame - 5]
+                ram[ram[2]] = ram[ram[0] - 1]
+                ram[0] = ram[2] + 1
+                ram[4], ram[3], ram[2], ram[1] = ram[frame - 1], ram[frame - 2], ram[frame - 3], ram[frame - 4]
+
+                if returnAddress == -1:
+                    return 'return'
+                pc = returnAddress
+
+            elif command != 'label':
+                raise VMError(f'unknown command {command}')
+
+            if not STACK_BASE <= ram[0] < HEAP_BASE:
+                raise VMError(f'stack pointer out of range at {ram[0]}')
+
+    # OS
+
+    def _callOS(self, name: str, args: list[int]) -> str:
+        # Sets self.result to the return value of an OS function. Returns the status to stop with, or None.
+
+        className = name.split('.')[0]
+        self.result = 0
+
+        if className in TRACED_CLASSES or name in TRACED_FUNCTIONS:
+            self.trace.append((name, self._strings(name, args)))
+            if len(self.trace) >= self.maxOutputs:
+                return 'outputs'
+
+        match name:
+            case 'Math.multiply': self.result = args[0] * args[1]
+            case 'Math.divide':
+                if args[1] == 0:
+                    raise VMError('division by zero')
+                self.result = abs(args[0]) // abs(args[1]) * (-1 if (args[0] < 0) != (args[1] < 0) else 1)
+            case 'Math.abs': self.result = abs(args[0])
+            case 'Math.min': self.result = min(args)
+            case 'Math.max': self.result = max(args)
+            case 'Math.sqrt':
+                if args[0] < 0:
+                    raise VMError('square root of a negative number')
+                self.result = int(args[0] ** 0.5)
+
+            case 'Memory.peek': self.result = self.ram[self._checked(args[0])]
+            case 'Memory.poke': self.ram[self._checked(args[0])] = args[1]
+            case 'Memory.alloc' | 'Array.new': self.result = self._alloc(args[0])
+
+            case 'String.new':
+                self.result = self._alloc(1)
+                self.strings[self.result] = ''
+            case 'String.length': self.result = len(self._string(args[0]))
+            case 'String.charAt': self.result = ord(self._string(args[0])[args[1]])
+            case 'String.setCharAt':
+                text = self._string(args[0])
+                self.strings[args[0]] = text[:args[1]] + chr(args[2]) + text[args[1] + 1:]
+            case 'String.appendChar':
+                self.strings[args[0]] = self._string(args[0]) + chr(args[1])
+                self.result = args[0]
+            case 'String.eraseLastChar': self.strings[args[0]] = self._string(args[0])[:-1]
+            case 'String.intValue':
+                number = re.match(r'-?\d*', self._string(args[0])).group()
+                self.result = int(number) if number not in ('', '-') else 0
+            case 'String.setInt': self.strings[args[0]] = str(args[1])
+            case 'String.newLine': self.result = NEWLINE
+            case 'String.backSpace': self.result = BACKSPACE
+            case 'String.doubleQuote': self.result = DOUBLE_QUOTE
+
+            case 'Keyboard.keyPressed' | 'Keyboard.readChar' | 'Keyboard.readInt':
+                self.result = self.keys.pop(0) if self.keys else 0
+            case 'Keyboard.readLine':
+                self.result = self._alloc(1)
+                self.strings[self.result] = ''
+
+            case 'Sys.halt': return 'halt'
+            case 'Sys.error': return 'error'
+
+            case _ if className in TRACED_CLASSES or name.endswith(('.init', '.dispose', '.deAlloc')):
+                pass
+            case _:
+                raise VMError(f'call to undefined function {name}')
+
+        return None
+
+    def _strings(self, name: str, args: list[int]) -> tuple:
+        # Arguments of a traced call, with the text of the string a string argument points to
+        if name in ('Output.printString', 'Keyboard.readLine', 'Keyboard.readInt'):
+            return (self._string(args[0]),)
+
+        return tuple(args)
+
+    def _string(self, address: int) -> str:
+        if address not in self.strings:
+            raise VMError(f'no string at {address}')
+
+        return self.strings[address]
+
+    def _alloc(self, size: int) -> int:
+        if size < 0:
+            raise VMError(f'allocation of {size} words')
+
+        address = self.heap
+        self.heap += max(size, 1)
+
+        if self.heap > RAM_SIZE:
+            raise VMError('heap exhausted')
+
+        return address
+
+    def _checked(self, address: int) -> int:
+        if not 0 <= address < RAM_SIZE:
+            raise VMError(f'address {address} is outside the RAM')
+
+        return address
+
+
+def runProject(sources: dict[str, str], keys=()) -> Run:
+    try:
+        return VMSimulator(sources, keys).run()
+    except VMError as error:   # the code cannot be loaded
+        return Run(f'fault: {error}', [], 0)
+
+def main():
+    sources = {}
+    for path in sorted(glob.glob(f'{sys.argv[1]}/*.vm')):
+        with open(path) as infile:
+            sources[os.path.basename(path)] = infile.read()
+
+    status, trace, steps = runProject(sources)
+    for name, args in trace:
+        print(name, *args)
+    print(f'{status} after {steps} steps')
+
+if __name__ == '__main__':
+    main()
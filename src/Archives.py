@@ -0,0 +1,76 @@
+import io
+import os
+import tarfile
+import zipfile
+
+from typing import Iterator
+
+# suffix -> tarfile stream compression, zip archives are written as zip
+archiveSuffixes = {
+    '.zip': None,
+    '.tar': '',
+    '.tar.gz': 'gz',
+    '.tgz': 'gz',
+    '.tar.bz2': 'bz2',
+    '.tar.xz': 'xz'
+}
+
+def isArchive(path: str) -> bool:
+    return os.path.isfile(path) and (zipfile.is_zipfile(path) or tarfile.is_tarfile(path))
+
+def _splitSuffix(path: str) -> tuple[str, str]:
+    for suffix in sorted(archiveSuffixes, key=len, reverse=True):
+        if path.endswith(suffix):
+            return path[:-len(suffix)], suffix
+
+    return path, '.zip' if zipfile.is_zipfile(path) else '.tar'
+
+def outputArchiveName(path: str) -> str:
+    # bundle.tar.gz -> bundle_vm.tar.gz
+    stem, suffix = _splitSuffix(path)
+    return f'{stem}_vm{suffix}'
+
+def readSources(path: str) -> Iterator[tuple[str, str]]:
+    # (member name, contents) of each .jack member, read one at a time without extracting the archive
+
+    if zipfile.is_zipfile(path):
+        with zipfile.ZipFile(path) as archive:
+            for info in archive.infolist():
+                if not info.is_dir() and info.filename.endswith('.jack'):
+                    yield info.filename, archive.read(info).decode()
+
+    else:
+        with tarfile.open(path, 'r|*') as archive:
+            for member in archive:
+                if member.isfile() and member.name.endswith('.jack'):
+                    yield member.name, archive.extractfile(member).read().decode()
+
+
+class ArchiveWriter:
+    '''Writes files into a new zip or tar archive, chosen by the suffix of its name'''
+
+    def __init__(self, path: str):
+        self.path = path
+        compression = archiveSuffixes[_splitSuffix(path)[1]]
+
+        if compression is None:
+            self._archive = zipfile.ZipFile(path, 'w', zipfile.ZIP_DEFLATED)
+        else:
+            self._archive = tarfile.open(path, f'w|{compression}')
+
+    def add(self, name: str, data: bytes):
+        if isinstance(self._archive, zipfile.ZipFile):
+            self._archive.writestr(name, data)
+        else:
+            info = tarfile.TarInfo(name)
+            info.size = len(data)
+            self._archive.addfile(info, io.BytesIO(data))
+
+    def close(self):
+        self._archive.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
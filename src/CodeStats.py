@@ -0,0 +1,139 @@
+from collections import Counter
+
+# Operand stack effect of each command, calls pop their arguments and push the result
+stackEffects = {
+    'push': 1, 'pop': -1,
+    'add': -1, 'sub': -1, 'eq': -1, 'gt': -1, 'lt': -1, 'and': -1, 'or': -1,
+    'neg': 0, 'not': 0,
+    'label': 0, 'goto': 0, 'if-goto': -1,
+    'function': 0, 'return': -1
+}
+
+mathFunctions = ('Math.multiply', 'Math.divide')
+stringFunctions = ('String.new', 'String.appendChar')
+
+def maxStackDepth(body: list[tuple]) -> int:
+    # Deepest the operand stack of a function gets, not counting the frames of functions it calls.
+    # Follows every path from the start; the compiler leaves the stack at the same depth on all paths to a label.
+
+    labels = {args[0]: pos for pos, (command, *args) in enumerate(body) if command == 'label'}
+    depths = {0: 0}
+    work = [0]
+    maxDepth = 0
+
+    while work:
+        pos = work.pop()
+        command, *args = body[pos]
+
+        depth = depths[pos] + (1 - args[1] if command == 'call' else stackEffects[command])
+        maxDepth = max(maxDepth, depth)
+
+        if command == 'goto':
+            successors = [labels[args[0]]]
+        elif command == 'if-goto':
+            successors = [pos + 1, labels[args[0]]]
+        elif command == 'return':
+            successors = []
+        else:
+            successors = [pos + 1]
+
+        for successor in successors:
+            if successor < len(body) and successor not in depths:
+                depths[successor] = depth
+                work.append(successor)
+
+    return maxDepth
+
+
+class FunctionStats:
+    '''Size and cost indicators of the compiled code of one function'''
+
+    def __init__(self, body: list[tuple]):
+        # body: instructions from its 'function' command up to the next one
+
+        self.opcodes = Counter(command for command, *_ in body)
+        self.instructions = len(body)
+        self.maxStack = maxStackDepth(body)
+
+        calls = Counter(args[0] for command, *args in body if command == 'call')
+        self.mathCalls = {name: calls[name] for name in mathFunctions}
+        self.stringCalls = {name: calls[name] for name in stringFunctions}
+
+        # Reads and writes through the that segment: array elements, and with inlining also the fields of
+        # other objects in expanded getters and setters, which the instructions do not tell apart
+        self.thatAccesses = sum(1 for command, *args in body if command in ('push', 'pop') and args[0] == 'that')
+
+    def toJson(self) -> dict:
+        return {
+            'instructions': self.instructions,
+            'opcodes': dict(self.opcodes.most_common()),
+            'maxStack': self.maxStack,
+            'mathCalls': self.mathCalls,
+            'stringCalls': self.stringCalls,
+            'thatAccesses': self.thatAccesses
+        }
+
+
+class CodeStats:
+    '''Per class and subroutine statistics of compiled code, kept apart for each project of a recursive build'''
+
+    def __init__(self):
+        self.functions: dict[tuple[str, str], FunctionStats] = {}   # (project, function name) -> statistics
+
+    def add(self, instructions: list[tuple], project=''):
+        # Adds the functions of one compiled file
+        # project: directory of the file relative to the root of a recursive build, '' otherwise
+        start = None
+
+        for pos, instruction in enumerate(instructions):
+            if instruction[0] == 'function':
+                if start is not None:
+                    self._addFunction(instructions[start:pos], project)
+                start = pos
+
+        if start is not None:
+            self._addFunction(instructions[start:], project)
+
+    def _addFunction(self, body: list[tuple], project: str):
+        self.functions[project, body[0][1]] = FunctionStats(body)
+
+    def toJson(self) -> dict:
+        # One project: its classes at the top level. Several: the classes of each under 'projects'.
+        projects = sorted({project for project, _ in self.functions})
+
+        if projects == ['']:
+            return self._projectJson('')
+
+        return {
+            'instructions': sum(stats.instructions for stats in self.functions.values()),
+            'projects': {project: self._projectJson(project) for project in projects}
+        }
+
+    def _projectJson(self, project: str) -> dict:
+        classes = {}
+        functions = {name: stats for (statsProject, name), stats in self.functions.items() if statsProject == project}
+
+        for name, stats in sorted(functions.items()):
+            className, subroutineName = name.split('.', 1)
+            classStats = classes.setdefault(className, {'instructions': 0, 'maxStack': 0, 'subroutines': {}})
+
+            classStats['instructions'] += stats.instructions
+            classStats['maxStack'] = max(classStats['maxStack'], stats.maxStack)
+            classStats['subroutines'][subroutineName] = stats.toJson()
+
+        return {
+            'instructions': sum(stats.instructions for stats in functions.values()),
+            'classes': classes
+        }
+
+    def table(self, top: int) -> str:
+        # The top functions by instruction count
+        header = f'{'function':<32} {'instrs':>7} {'stack':>6} {'mul/div':>8} {'string':>7} {'that':>6}'
+        rows = [header, '-' * len(header)]
+
+        for (project, name), stats in sorted(self.functions.items(), key=lambda item: -item[1].instructions)[:top]:
+            name = f'{project}/{name}' if project else name
+            rows.append(f'{name:<32} {stats.instructions:>7} {stats.maxStack:>6} {sum(stats.mathCalls.values()):>8} '
+                        f'{sum(stats.stringCalls.values()):>7} {stats.thatAccesses:>6}')
+
+        return '\n'.join(rows)
@@ -1,32 +1,94 @@
 from src.JackTokenizer import JackTokenizer, Token
 from src.SymbolTable import SymbolTable
 from src.VMWriter import VMWriter
+from src.CompilerOptions import CompilerOptions
 from src.CompilerResources import *
 
+from collections import Counter
+
+import os
+
+
+def describeToken(token) -> str:
+    if token is None:
+        return 'end of file'
+
+    val = token.val.value if isinstance(token.val, VALUE) else token.val
+    return f'"{val}"' if token.type is TYPE.STRING_CONST else f"'{val}'"
+
+def describeReqs(reqs) -> str:
+    # (type, val) -> 'val', (type, ) -> any type
+    return ' | '.join(sorted(f"'{req[1].value}'" if len(req) > 1 else f'any {req[0].value}' for req in reqs))
+
+def constantValue(instructions: list[tuple]) -> int:
+    # Value of compiled expression code that pushes a constant and negates or inverts it, else None
+    if not instructions or instructions[0][:2] != ('push', SEGMENT.CONST.value):
+        return None
+
+    value = instructions[0][2]
+
+    for instruction in instructions[1:]:
+        if instruction == (COMMAND.NEG.value, ):
+            value = -value
+        elif instruction == (COMMAND.NOT.value, ):
+            value = ~value
+        else:
+            return None
+
+    return value
+
+def isTrue(value: int) -> bool:
+    # Conditions are true only when -1, in 16 bits
+    return value & 0xFFFF == 0xFFFF
+
 
 class TokenError(Exception):
     '''Next token does not match expected token value or type'''
 
-    def __new__(cls, tokenType: TYPE, tokenVal=VALUE.WILDCARD):
+    def __new__(cls, tokenType: TYPE, tokenVal=VALUE.WILDCARD, *, token=None):
         if tokenVal is VALUE.WILDCARD:
             return super().__new__(WildcardTokenError)
         
         return super().__new__(cls)
 
-    def __init__(self, tokenType: TYPE, tokenVal: VALUE):
+    def __init__(self, tokenType: TYPE, tokenVal: VALUE, *, token=None):
         message = f'{tokenType.value} token expected: {tokenVal.value}'
         super().__init__(message)
+        self.token = token
 
 class WildcardTokenError(TokenError):
-    '''Next token does not match expected token type'''
+    '''Next token does not match expected token type, set of tokens or nonterminal'''
+
+    def __init__(self, tokenType, tokenVal=VALUE.WILDCARD, *, token=None):
+        if isinstance(tokenType, TYPE):
+            message = f'Any {tokenType.value} token expected'
+        elif isinstance(tokenType, str):
+            message = f'{tokenType} expected'
+        else:
+            message = f'One of {describeReqs(tokenType)} expected'
 
-    def __init__(self, tokenType: TYPE, tokenVal: VALUE):
-        message = f'Any {tokenType.value} token expected'
         super(Exception, self).__init__(message)
+        self.token = token
 
 class JackCompilerError(Exception):
-    def __init__(self, *args):
+    def __init__(self, *args, token=None):
         super().__init__(*args)
+        self.token = token
+
+COMPILE_ERRORS = (TokenError, JackCompilerError)
+
+
+class Diagnostic:
+    '''Compilation error and its position in the source file'''
+
+    def __init__(self, filename: str, line: int, col: int, message: str):
+        self.filename = filename
+        self.line = line
+        self.col = col
+        self.message = message
+
+    def __str__(self):
+        return f'{self.filename}:{self.line}:{self.col}: error: {self.message}'
 
 
 
@@ -46,18 +108,90 @@ class CompilationEngine:
         SYMBOL.SLASH: 'Math.divide'
     }
 
-    def __init__(self, infile: str, outfile: str, dumpfile: str):
-        # self.infile = infile
-        self._tokenizer = JackTokenizer(infile)
-        self.writer = VMWriter(outfile)
-        self.labelCount = 0
+    # operators whose result is 0 or -1, always or when both operands are
+    comparisonOps = frozenset({SYMBOL.EQUAL, SYMBOL.GREATER_THAN, SYMBOL.LESS_THAN})
+    logicalOps = frozenset({SYMBOL.AMPERSAND, SYMBOL.VERTICAL_BAR})
+
+    # temp 0 and 1 are scratch space for array stores, do statements and inlined calls
+    arrayTempSlots = (2, 3, 4, 5, 6, 7)
+
+    def __init__(self, infile: str, outfile: str, dumpfile: str, options=None, inliner=None, cache=None, *,
+                 source=None, deferOutput=False, interfaces=None):
+        # infile: file to compile right away, None to only set up the engine for compileFile
+        # source: contents of infile if already read
+        # deferOutput: leave writing the output to the caller, through finishOutput
+        # interfaces: InterfaceIndex to check calls against, None to not check them
+
+        self.options = options or CompilerOptions()
+        self._tokenizer = None
+        if self.options.binary:
+            from src.VMBytecode import VMBinaryWriter   # optional passes and formats are imported on first use
+            self.writer = VMBinaryWriter(outfile)
+        else:
+            self.writer = VMWriter(outfile)
+        self.inliner = inliner
+        self.cache = cache
+        self.interfaces = interfaces
 
         self.classSymbolTable = SymbolTable(dumpfile)  # STATIC and FIELD variables
-        self.methodSymbolTable = SymbolTable(dumpfile) # ARG and LOCAL variables 
+        self.methodSymbolTable = SymbolTable(dumpfile, parent=self.classSymbolTable) # ARG and LOCAL variables 
+
+        if infile is not None:
+            self.compileFile(infile, outfile, source=source, deferOutput=deferOutput)
+
+    def compileFile(self, infile: str, outfile: str, *, source=None, deferOutput=False):
+        # Compiles one file. The tokenizer, writer and symbol tables of the previous file are reset and reused,
+        # so an engine can compile any number of files one after another. With deferOutput, finishOutput must be
+        # called before the next file.
+
+        self.infile = infile
+        if self._tokenizer is None:
+            self._tokenizer = JackTokenizer(infile, source)
+        else:
+            self._tokenizer.reset(infile, source)
+        self.writer.reset(outfile)
+        self.classSymbolTable.reset()
+        self.methodSymbolTable.reset()
+        self.labelCount = 0
+        self._dumps = []                # symbol table dumps written for this file, in order
+
+        self._thatPtr = None            # (base, index) locations of the address in pointer 1, if known
+        self._arrayTemps = {}           # (base, index) -> temp slot holding that address
+        self._arrayUses = Counter()     # simple array accesses in the current statement
+        self._userCalls = False         # current statement calls a subroutine
 
-        self.compileClass()
+        self._hoisted = {}              # first token -> (length, kind, location) of expressions computed before a loop
 
-        self.writer.close()
+        self.diagnostics = [Diagnostic(infile, *error) for error in self._tokenizer.errors]
+
+        try:
+            self.compileClass()
+        except COMPILE_ERRORS as error:
+            self._report(error)
+
+        self.diagnostics.sort(key=lambda diagnostic: (diagnostic.line, diagnostic.col))
+
+        if not deferOutput:
+            self.finishOutput()
+
+    def finishOutput(self):
+        # Writes the output file, or removes a stale one if the source has errors
+        mapfile = f'{self.writer.outfile}.map'
+
+        if self.diagnostics:
+            self.writer.discard()
+            if os.path.exists(mapfile):
+                os.remove(mapfile)
+        else:
+            self.writer.close()
+            if self.options.sourceMap:
+                from src.SourceMap import mapSourceName
+                self.sourceMap(mapSourceName(self.infile, mapfile)).write(mapfile)
+
+    def sourceMap(self, sourceName: str):
+        from src.SourceMap import SourceMap
+        self.writer.finishLineMarks()
+        return SourceMap(sourceName, self.writer.lineMarks)
 
     def getLabel(self):
         val = self.labelCount
@@ -71,18 +205,25 @@ class CompilationEngine:
     # ADVANCE METHODS
 
     def advance(self) -> Token:
-        return self._tokenizer.advance()
+        token = self._tokenizer.advance()
+
+        if token is not None:
+            self.writer.setLine(token.line)
+
+        return token
 
     def guardedAdvance(self, reqType: TYPE, reqVal=VALUE.WILDCARD):
-        token = self.advance()
+        # The token is only consumed if it matches, so error recovery can resume at it
 
-        if not self.compareToken(token, reqType, reqVal):
-            raise TokenError(reqType, reqVal)
+        if not self.compareToken(token := self._tokenizer.nextToken, reqType, reqVal):
+            raise TokenError(reqType, reqVal, token=token)
 
-        return token.val
+        return self.advance().val
     
     def compareToken(self, token, reqType: TYPE, reqVal=VALUE.WILDCARD) -> bool:
-        if reqVal is VALUE.WILDCARD:
+        if token is None:
+            return False
+        elif reqVal is VALUE.WILDCARD:
             return token.type is reqType
         else:
             return (token.type, token.val) == (reqType, reqVal)
@@ -100,6 +241,24 @@ class CompilationEngine:
     def nextTokenIsOneOf(self, *args):
         return self.compareTokens(self._tokenizer.nextToken, *args)
 
+    def _blockTokens(self) -> list[Token]:
+        # Upcoming tokens up to the '}' closing the first '{', such as a whole loop or subroutine
+
+        tokens = []
+        depth = 0
+
+        while (token := self._tokenizer.peek(len(tokens))) is not None:
+            tokens.append(token)
+
+            if token.val is SYMBOL.CURL_L:
+                depth += 1
+            elif token.val is SYMBOL.CURL_R:
+                depth -= 1
+                if depth == 0:
+                    break
+
+        return tokens
+
 
 
     # VERIFIER METHODS
@@ -129,7 +288,7 @@ class CompilationEngine:
             if self.compareToken(nextToken, *reqs):
                 return self.guardedAdvance(*reqs)
         
-        raise TokenError(reqsList)
+        raise TokenError(reqsList, token=nextToken)
 
     def verifyVarType(self):
         return self.verifySet(TOKENSET.DATA_TYPES)
@@ -168,14 +327,25 @@ class CompilationEngine:
         self.verifySymbol(SYMBOL.CURL_L)
 
         while self.isClassVarDec():
-            self.compileClassVarDec()
-
-        while self.isSubroutineDec():
-            self.compileSubroutine()
+            try:
+                self.compileClassVarDec()
+            except COMPILE_ERRORS as error:
+                self._report(error)
+                self._recover(TOKENSET.CLASS_VAR_DEC | TOKENSET.SUBROUTINE_DEC)
+
+        while not self._atClassEnd():
+            try:
+                if not self.isSubroutineDec():
+                    raise TokenError(NONTERMINAL.SUBROUTINE_DEC, token=self._tokenizer.nextToken)
+
+                self.compileSubroutine()
+            except COMPILE_ERRORS as error:
+                self._report(error)
+                self._recoverSubroutine()
 
         self.verifySymbol(SYMBOL.CURL_R)
 
-        self.classSymbolTable.dumpTable(f'{self.className} class')
+        self._writeDump(self.classSymbolTable.dumpText(f'{self.className} class'))
 
     def compileClassVarDec(self):
         # ('static' | 'field') type varName ( ',' varName )* ';'
@@ -194,13 +364,63 @@ class CompilationEngine:
         self.verifySymbol(SYMBOL.SEMICOLON)
 
     def compileSubroutine(self):
+        # Reuses the output of an unchanged subroutine if it is cached
+
+        if self.options.stableLabels:
+            self.labelCount = 0
+
+        if self.cache is None:
+            self._compileSubroutine()
+            return
+
+        nErrors = len(self.diagnostics)
+
+        tokens = self._blockTokens()
+        firstLine = tokens[0].line
+
+        # lines are relative, so a subroutine that only moved is still found
+        key = self.cache.key(
+            [(token.type, token.val, token.line - firstLine) for token in tokens],
+            self.className,
+            self.classSymbolTable,
+            self.options.codegenKey(),
+            sorted(self.inliner.bodies.items()) if self.inliner else None,
+            self.interfaces.signature(self._calledClasses(tokens)) if self.interfaces else None
+        )
+
+        if (entry := self.cache.get(key)) is not None:
+            instructions, lineMarks, dump = entry
+            for _ in tokens:
+                self.advance()
+            self.writer.writeInstructions(instructions, lineMarks, firstLine)
+            self._writeDump(dump)
+
+        else:
+            start = len(self.writer.instructions)
+            dump = self._compileSubroutine()
+
+            if len(self.diagnostics) == nErrors:
+                self.cache.put(key, self.writer.instructions[start:], self.writer.lineMarksFrom(start, firstLine), dump)
+
+    def _calledClasses(self, tokens: list[Token]) -> set[str]:
+        # Classes whose subroutines the tokens can call: those named in them, including the types of their
+        # variables, the types of the class variables, and this class
+
+        names = {token.val for token in tokens if token.type is TYPE.IDENTIFIER}
+        names.update(entry.type for entry in self.classSymbolTable.data.values())
+        names.add(self.className)
+        return names
+
+    def _compileSubroutine(self) -> str:
         # ('constructor' | 'function' | 'method') ('void' | type) subroutineName '(' parameterList ')' subroutineBody
+        # Returns the dump of the subroutine's symbol table
 
         # constructor:  push # field vars, alloc, then pop address to this ptr
         # method:       pop address of this/self (first arg) to this ptr
         # function:     no extra args
 
         subroutineType = self.verifyKeyword()
+        self.subroutineType = subroutineType
         self.verifyReturnType()
         subroutineName = self._compileName()
 
@@ -215,7 +435,17 @@ class CompilationEngine:
 
         self.compileSubroutineBody(subroutineName, subroutineType)
 
-        self.methodSymbolTable.dumpTable(f'{subroutineName} method')
+        dump = self.methodSymbolTable.dumpText(f'{subroutineName} method')
+        self._writeDump(dump)
+        return dump
+
+    def _writeDump(self, text: str):
+        self._dumps.append(text)
+        self.methodSymbolTable.writeDump(text)
+
+    def dumpText(self) -> str:
+        # Everything written to the dump file for the last file compiled, e.g. to store alongside its output
+        return '\n'.join(self._dumps)
 
     def compileParameterList(self):
         # ( ( type varName ) ( ',' type varName )* )?
@@ -238,13 +468,20 @@ class CompilationEngine:
         self.verifySymbol(SYMBOL.CURL_L)
 
         while self.isVarDec():
-            self.compileVarDec()
+            try:
+                self.compileVarDec()
+            except COMPILE_ERRORS as error:
+                self._report(error)
+                self._recover(TOKENSET.STATEMENTS | TOKENSET.SUBROUTINE_DEC | {(TYPE.KEYWORD, KEYWORD.VAR)})
 
         self._compileFunctionHeader(name, type)
 
         self.compileStatements()
         self.verifySymbol(SYMBOL.CURL_R)
 
+        if self.options.hoist:
+            self.writer.setLocalCount(self.methodSymbolTable.varCount(SEGMENT.LOCAL))
+
     def compileVarDec(self):
         # 'var' type varName ( ',' varName )* ';'
 
@@ -266,6 +503,7 @@ class CompilationEngine:
         functionName = f'{self.className}.{name}'
         nVars = self.methodSymbolTable.varCount(SEGMENT.LOCAL)
         self.writer.writeFunction(functionName, nVars)
+        self._forgetThatPtr()
 
         if type is KEYWORD.CONSTRUCTOR:
             nFields = self.classSymbolTable.varCount(SEGMENT.THIS)
@@ -280,20 +518,15 @@ class CompilationEngine:
             self.writer.writePopThisPtr()
 
 
-    def _isVarName(self, name):
-        if name in self.methodSymbolTable:
-            return self.methodSymbolTable
-
-        elif name in self.classSymbolTable:
-            return self.classSymbolTable
-
-        return None
+    def _lookupVar(self, name) -> SymbolTable.Entry:
+        # The method table also sees class variables, so one lookup covers both scopes
+        return self.methodSymbolTable.lookup(name)
 
     def _compileVarName(self, *, isDeclaration=False, **kwargs):
         if not self.nextTokenIs(TYPE.IDENTIFIER):
-            raise TokenError(TYPE.IDENTIFIER)
+            raise TokenError(TYPE.IDENTIFIER, token=self._tokenizer.nextToken)
 
-        token = self._tokenizer.advance()
+        token = self.advance()
         varName = token.val
 
         if isDeclaration:
@@ -307,16 +540,16 @@ class CompilationEngine:
         currSymbolTable.define(name, type, segment)
 
     def _compileSymbolUse(self, name: str):
-        if not (currSymbolTable := self._isVarName(name)):
-            raise JackCompilerError(f'Undefined symbol: {name}')
+        if (entry := self._lookupVar(name)) is None:
+            raise JackCompilerError(f'Undefined symbol: {name}', token=self._tokenizer.currToken)
 
-        return currSymbolTable.getEntry(name)
+        return entry
 
     def _compileName(self):
         if not self.nextTokenIs(TYPE.IDENTIFIER):
-            raise TokenError(TYPE.IDENTIFIER)
+            raise TokenError(TYPE.IDENTIFIER, token=self._tokenizer.nextToken)
 
-        token = self._tokenizer.advance()
+        token = self.advance()
         name = token.val
 
         return name
@@ -332,11 +565,13 @@ class CompilationEngine:
 
         className = self.className
         nArgs = 1
+        nameToken = self._tokenizer.nextToken
+        qualified = self.compareToken(self._tokenizer.peekSecond(), TYPE.SYMBOL, SYMBOL.DOT)
 
-        if self.compareToken(self._tokenizer.peekSecond(), TYPE.SYMBOL, SYMBOL.DOT):
+        if qualified:
             symbolName = self._tokenizer.nextToken.val
 
-            if self._isVarName(symbolName):
+            if self._lookupVar(symbolName):
                 type, segment, index = self._compileVarName()
                 self.writer.writePush(segment, index)
                 className = type
@@ -350,6 +585,7 @@ class CompilationEngine:
         else:
             self.writer.writePushThisPtr()
 
+        methodCall = nArgs == 1
         subroutineName = self._compileName()
 
         self.verifySymbol(SYMBOL.PAREN_L)
@@ -357,28 +593,56 @@ class CompilationEngine:
         self.verifySymbol(SYMBOL.PAREN_R)
 
         functionName = f'{className}.{subroutineName}'
-        self.writer.writeCall(functionName, nArgs)
+
+        if self.interfaces:
+            messages = [self.interfaces.checkCall(className, subroutineName, nArgs, methodCall)]
+
+            if not qualified and self.subroutineType is KEYWORD.FUNCTION:
+                messages.append(f'{functionName} is called on this in a function, which has no object')
+
+            for message in filter(None, messages):
+                self._report(JackCompilerError(message, token=nameToken))   # the call is still compiled, to find more errors
+
+        if not (self.inliner and self.inliner.expand(self.writer, functionName, nArgs)):
+            self.writer.writeCall(functionName, nArgs)
+
+        self._forgetThatPtr()
 
 
 
     def compileStatements(self):
         # ( letStatement | ifStatement | whileStatement | doStatement | returnStatement )*
 
-        self.statementMap = {
-            KEYWORD.LET: self.compileLet,
-            KEYWORD.IF: self.compileIf,
-            KEYWORD.WHILE: self.compileWhile,
-            KEYWORD.DO: self.compileDo,
-            KEYWORD.RETURN: self.compileReturn
-        }
+        while True:
+            if self.isStatement():
+                if self.options.arrays:
+                    self._scanArrayUses()
+
+                try:
+                    if self.options.tables and self._compileConstantStores():
+                        continue
+
+                    CompilationEngine.statementMap[self._tokenizer.nextToken.val](self)
+                except COMPILE_ERRORS as error:
+                    self._report(error)
+                    self._recover(TOKENSET.STATEMENTS | TOKENSET.SUBROUTINE_DEC, blocks=True)
+
+            elif self._tokenizer.nextToken is None or self.nextTokenIs(TYPE.SYMBOL, SYMBOL.CURL_R) or self.isSubroutineDec():
+                break
 
-        while self.isStatement():
-            self.statementMap[self._tokenizer.nextToken.val]()
+            else:
+                self._report(TokenError(NONTERMINAL.STATEMENT, token=self.advance()))
+                self._recover(TOKENSET.STATEMENTS | TOKENSET.SUBROUTINE_DEC, blocks=True)
 
     def compileLet(self):
         # 'let' varName ( '[' expression ']' )? '=' expression ';'
 
         self.verifyKeyword(KEYWORD.LET)
+
+        if self.options.arrays and (key := self._arrayKey()):
+            self._compileArrayStore(*key)
+            return
+
         _, segment, index = self._compileVarName()
 
         if self.nextTokenIs(TYPE.SYMBOL, SYMBOL.SQUARE_L):
@@ -398,6 +662,7 @@ class CompilationEngine:
             self.writer.writePopThatPtr()
             self.writer.writePush(SEGMENT.TEMP, 0)
             self.writer.writePop(SEGMENT.THAT, 0)
+            self._forgetThatPtr()
 
         else:
             self.verifySymbol(SYMBOL.EQUAL)
@@ -406,25 +671,44 @@ class CompilationEngine:
 
             self.writer.writePop(segment, index)
 
+            if self._thatPtr is not None and (segment, index) in self._thatPtr:
+                self._forgetThatPtr()
+
     def compileIf(self):
         # 'if' '(' expression ')' '{' statements '}' ( 'else' '{' statements '}' )?
 
         ifLabel, gotoLabel = self.getLabelPair()
 
         self.verifyKeyword(KEYWORD.IF)
-        self.verifySymbol(SYMBOL.PAREN_L)
-        self.compileExpression()
-        self.verifySymbol(SYMBOL.PAREN_R)
 
-        self.writer.writeArithmetic(COMMAND.NOT)
-        self.writer.writeIf(ifLabel)
+        if self.options.conditions:
+            _, value = self._compileCondition()
+
+            if value is None:
+                self._writeBranch(ifLabel)
+            elif not isTrue(value):
+                self.writer.writeGoto(ifLabel)
+
+        else:
+            self.verifySymbol(SYMBOL.PAREN_L)
+            self.compileExpression()
+            self.verifySymbol(SYMBOL.PAREN_R)
+
+            self.writer.writeArithmetic(COMMAND.NOT)
+            self.writer.writeIf(ifLabel)
 
         self.verifySymbol(SYMBOL.CURL_L)
         self.compileStatements()
         self.verifySymbol(SYMBOL.CURL_R)
 
+        if self.options.conditions and not self.nextTokenIs(TYPE.KEYWORD, KEYWORD.ELSE):
+            self.writer.writeLabel(ifLabel)     # nothing to jump over
+            self._forgetThatPtr()
+            return
+
         self.writer.writeGoto(gotoLabel)
         self.writer.writeLabel(ifLabel)
+        self._forgetThatPtr()
 
         if self.nextTokenIs(TYPE.KEYWORD, KEYWORD.ELSE):
             self.verifyKeyword(KEYWORD.ELSE)
@@ -433,15 +717,26 @@ class CompilationEngine:
             self.verifySymbol(SYMBOL.CURL_R)
 
         self.writer.writeLabel(gotoLabel)
+        self._forgetThatPtr()
 
     def compileWhile(self):
         # 'while' '(' expression ')' '{' statements '}'
 
         loopLabel, exitLabel = self.getLabelPair()
 
+        hoisted = self._hoistInvariants() if self.options.hoist else []
+
         self.verifyKeyword(KEYWORD.WHILE)
 
+        if self.options.conditions:
+            self._compileRotatedWhile(loopLabel, exitLabel)
+
+            for token in hoisted:
+                del self._hoisted[token]
+            return
+
         self.writer.writeLabel(loopLabel)
+        self._forgetThatPtr()
 
         self.verifySymbol(SYMBOL.PAREN_L)
         self.compileExpression()
@@ -456,6 +751,79 @@ class CompilationEngine:
 
         self.writer.writeGoto(loopLabel)
         self.writer.writeLabel(exitLabel)
+        self._forgetThatPtr()
+
+        for token in hoisted:
+            del self._hoisted[token]
+
+    def _compileRotatedWhile(self, loopLabel, exitLabel):
+        # '(' expression ')' '{' statements '}'
+        # A loop on a 0 or -1 condition is laid out with the test at the bottom, so that each iteration runs
+        # a single if-goto back to the top instead of not, if-goto and goto:
+        #   goto test; label loop; statements; label test; condition; if-goto loop
+
+        start = len(self.writer.instructions)
+        self._forgetThatPtr()
+        isBoolean, value = self._compileCondition()
+        condition = self.writer.takeFrom(start)     # moved to the bottom or after the loop label
+
+        if rotated := isBoolean and value is None:
+            testLabel = self.getLabel()
+            self.writer.writeGoto(testLabel)
+            self.writer.writeLabel(loopLabel)
+
+        else:
+            self.writer.writeLabel(loopLabel)
+            self.writer.writeInstructions(*condition)
+
+            if value is None:
+                self._writeBranch(exitLabel)
+            elif not isTrue(value):
+                self.writer.writeGoto(exitLabel)
+
+        self.verifySymbol(SYMBOL.CURL_L)
+        self.compileStatements()
+        self.verifySymbol(SYMBOL.CURL_R)
+
+        if rotated:
+            self.writer.writeLabel(testLabel)
+            self.writer.writeInstructions(*condition)
+            self.writer.writeIf(loopLabel)
+        else:
+            self.writer.writeGoto(loopLabel)
+
+        self.writer.writeLabel(exitLabel)
+        self._forgetThatPtr()
+
+    def _compileCondition(self) -> tuple[bool, int]:
+        # '(' expression ')'
+        # Returns whether the value is known to be 0 or -1, and the value if it is constant, else None.
+        # Nothing is written for constant conditions.
+
+        self.verifySymbol(SYMBOL.PAREN_L)
+        start = len(self.writer.instructions)
+        isBoolean = self.compileExpression()
+        self.verifySymbol(SYMBOL.PAREN_R)
+
+        if (value := constantValue(self.writer.instructions[start:])) is not None:
+            self.writer.takeFrom(start)
+
+        return isBoolean, value
+
+    def _writeBranch(self, label):
+        # Jumps to label unless the condition just compiled is -1, the only value not + if-goto treats as true.
+        # ~x is not -1 exactly when x is not 0, and a = b exactly when a - b is not 0, so the value of x or
+        # a - b can be tested by if-goto directly.
+
+        if (last := self.writer.instructions[-1]) == (COMMAND.NOT.value, ):
+            self.writer.takeFrom(len(self.writer.instructions) - 1)
+        elif last == (COMMAND.EQ.value, ):
+            self.writer.takeFrom(len(self.writer.instructions) - 1)
+            self.writer.writeArithmetic(COMMAND.SUB)
+        else:
+            self.writer.writeArithmetic(COMMAND.NOT)
+
+        self.writer.writeIf(label)
 
     def compileDo(self):
         # 'do' subroutineCall ';'
@@ -480,29 +848,49 @@ class CompilationEngine:
 
         self.writer.writeReturn()
 
+    # statement keyword -> compile method, built once for the class
+    statementMap = {
+        KEYWORD.LET: compileLet,
+        KEYWORD.IF: compileIf,
+        KEYWORD.WHILE: compileWhile,
+        KEYWORD.DO: compileDo,
+        KEYWORD.RETURN: compileReturn
+    }
+
 
-    def compileExpression(self):
+    def compileExpression(self) -> bool:
         # term ( op term )*
+        # Returns whether the value is known to be 0 or -1, as is the value of compileTerm.
 
-        self.compileTerm()
+        isBoolean = False if self._compileHoisted(NONTERMINAL.EXPRESSION) else self.compileTerm()
 
         while self.nextTokenIsOneOf(TOKENSET.OPERATORS):
             op = self.verifySymbol()
-            self.compileTerm()
+            termIsBoolean = self.compileTerm()
 
             if op in CompilationEngine.commandLookup:
                 self.writer.writeArithmetic(CompilationEngine.commandLookup[op])
             else:
                 self.writer.writeCall(CompilationEngine.mathLookup[op], 2)
 
-    def compileTerm(self):
+            isBoolean = op in CompilationEngine.comparisonOps or \
+                        op in CompilationEngine.logicalOps and isBoolean and termIsBoolean
+
+        return isBoolean
+
+    def compileTerm(self) -> bool:
         # intConst | stringConst | keywordConst | varName | varName '[' expression ']'
         # | subroutineCall | '(' expression ')' | unaryOp term
 
         def isSubroutineCall(token):
             return self.compareTokens(token, TOKENSET.SUBROUTINE_CALL)
 
-        if self.nextTokenIs(TYPE.INT_CONST):
+        isBoolean = False
+
+        if self._compileHoisted(NONTERMINAL.TERM):
+            pass
+
+        elif self.nextTokenIs(TYPE.INT_CONST):
             val = self.verifyIntConst()
             self.writer.writeConstant(val)
 
@@ -517,10 +905,16 @@ class CompilationEngine:
             self.writer.writePush
 
         elif self.nextTokenIsOneOf(TOKENSET.KEYWORD_CONSTANTS):
-            self._compileKeywordConst()
+            isBoolean = self._compileKeywordConst() is not KEYWORD.THIS
 
         elif self.nextTokenIs(TYPE.IDENTIFIER):
-            if self.compareToken((secondToken := self._tokenizer.peekSecond()), TYPE.SYMBOL, SYMBOL.SQUARE_L):
+            if self.options.arrays and (key := self._arrayKey()):
+                location, offset = key
+                self._skipArrayAccess()
+                self._loadThatPtr(location)
+                self.writer.writePush(SEGMENT.THAT, offset)
+
+            elif self.compareToken((secondToken := self._tokenizer.peekSecond()), TYPE.SYMBOL, SYMBOL.SQUARE_L):
                 _, segment, index = self._compileVarName()
                 self.writer.writePush(segment, index)
 
@@ -531,6 +925,7 @@ class CompilationEngine:
                 self.writer.writeArithmetic(COMMAND.ADD)
                 self.writer.writePopThatPtr()
                 self.writer.writePush(SEGMENT.THAT, 0)
+                self._forgetThatPtr()
 
             elif isSubroutineCall(secondToken):
                 self._compileSubroutineCall()
@@ -541,16 +936,18 @@ class CompilationEngine:
 
         elif self.nextTokenIs(TYPE.SYMBOL, SYMBOL.PAREN_L):
             self.verifySymbol(SYMBOL.PAREN_L)
-            self.compileExpression()
+            isBoolean = self.compileExpression()
             self.verifySymbol(SYMBOL.PAREN_R)
 
         elif self.nextTokenIsOneOf(TOKENSET.UNARY_OPS):
             op = COMMAND.NEG if self.verifySymbol() is SYMBOL.MINUS else COMMAND.NOT
-            self.compileTerm()
+            isBoolean = self.compileTerm() and op is COMMAND.NOT
             self.writer.writeArithmetic(op)
 
         else:
-            raise TokenError(NONTERMINAL.TERM)
+            raise TokenError(NONTERMINAL.TERM, token=self._tokenizer.nextToken)
+
+        return isBoolean
 
     def compileExpressionList(self) -> int:
         # ( expression ( ',' expression )* )?
@@ -569,7 +966,7 @@ class CompilationEngine:
         return count
 
 
-    def _compileKeywordConst(self):
+    def _compileKeywordConst(self) -> KEYWORD:
         # 'true' | 'false' | 'null' | 'this'
 
         if (constant := self.verifyKeyword()) is KEYWORD.TRUE:
@@ -581,3 +978,271 @@ class CompilationEngine:
 
         else:
             self.writer.writeConstant(0)
+
+        return constant
+
+
+    # ARRAY ACCESS METHODS
+    # An access is simple when its subscript is a constant or a variable. Its address then only depends on
+    # variables, so it can be identified by the (segment, index) locations of the array and the subscript.
+
+    def _arrayKey(self, offset=0):
+        # varName '[' ( integerConstant | varName ) ']'
+        # Returns ((base, index), thatOffset), with index None for constant subscripts, or None if not simple.
+
+        name, bracket, subscript, closing = (self._tokenizer.peek(offset + i) for i in range(4))
+
+        if closing is None or bracket.val is not SYMBOL.SQUARE_L or closing.val is not SYMBOL.SQUARE_R:
+            return None
+
+        if name.type is not TYPE.IDENTIFIER or not (baseEntry := self._lookupVar(name.val)):
+            return None
+
+        base = baseEntry[1:]
+
+        if subscript.type is TYPE.INT_CONST:
+            return (base, None), subscript.val
+
+        if subscript.type is TYPE.IDENTIFIER and (indexEntry := self._lookupVar(subscript.val)):
+            return (base, indexEntry[1:]), 0
+
+        return None
+
+    def _scanArrayUses(self):
+        # Counts the simple array accesses up to the end of the next statement or condition. Addresses used
+        # often are kept in temp slots, which any call may overwrite, so statements with calls are not counted.
+
+        self._arrayTemps = {}
+        self._arrayUses = Counter()
+        self._userCalls = False
+
+        uses = Counter()
+        hasCalls = False
+        offset = 0
+
+        while (token := self._tokenizer.peek(offset)) is not None and token.val not in (SYMBOL.SEMICOLON, SYMBOL.CURL_L):
+            if token.type is TYPE.IDENTIFIER and self.compareTokens(self._tokenizer.peek(offset + 1), TOKENSET.SUBROUTINE_CALL):
+                self._userCalls = True
+            elif token.type is TYPE.STRING_CONST or token.val in CompilationEngine.mathLookup:
+                hasCalls = True
+            elif key := self._arrayKey(offset):
+                uses[key[0]] += 1
+
+            offset += 1
+
+        if not (hasCalls or self._userCalls):
+            self._arrayUses = uses
+
+    def _skipArrayAccess(self):
+        self._compileVarName()
+        self.verifySymbol(SYMBOL.SQUARE_L)
+        self.advance()
+        self.verifySymbol(SYMBOL.SQUARE_R)
+
+    def _writeArrayAddress(self, base, index):
+        self.writer.writePush(*base)
+
+        if index is not None:
+            self.writer.writePush(*index)
+            self.writer.writeArithmetic(COMMAND.ADD)
+
+    def _loadThatPtr(self, location):
+        if location == self._thatPtr:
+            return
+
+        if (slot := self._arrayTemps.get(location)) is not None:
+            self.writer.writePush(SEGMENT.TEMP, slot)
+
+        else:
+            self._writeArrayAddress(*location)
+
+            slots = CompilationEngine.arrayTempSlots
+            if location[1] is not None and self._arrayUses[location] >= 3 and len(self._arrayTemps) < len(slots):
+                slot = slots[len(self._arrayTemps)]
+                self.writer.writePop(SEGMENT.TEMP, slot)
+                self.writer.writePush(SEGMENT.TEMP, slot)
+                self._arrayTemps[location] = slot
+
+        self.writer.writePopThatPtr()
+        self._thatPtr = location
+
+    def _forgetThatPtr(self):
+        self._thatPtr = None
+
+    def _compileArrayStore(self, location, offset):
+        # varName '[' ( integerConstant | varName ) ']' '=' expression ';'
+        # The address is computed after the value unless a call in the value could change the variables it uses.
+
+        base, index = location
+        deferred = not self._userCalls or all(loc is None or loc[0] in (SEGMENT.LOCAL, SEGMENT.ARG) for loc in location)
+
+        self._skipArrayAccess()
+
+        if not deferred:
+            self._writeArrayAddress(base, index)
+
+        self.verifySymbol(SYMBOL.EQUAL)
+        self.compileExpression()
+        self.verifySymbol(SYMBOL.SEMICOLON)
+
+        if deferred:
+            self._loadThatPtr(location)
+        else:
+            self.writer.writePop(SEGMENT.TEMP, 0)
+            self.writer.writePopThatPtr()
+            self.writer.writePush(SEGMENT.TEMP, 0)
+            self._forgetThatPtr()   # the variables may have changed since the address was computed
+
+        self.writer.writePop(SEGMENT.THAT, offset)
+
+    def _constantStore(self, offset) -> tuple[str, int, int, int]:
+        # 'let' varName '[' integerConstant ']' '=' ( '-'? integerConstant | 'true' | 'false' | 'null' ) ';'
+        # Returns (varName, subscript, value, length in tokens) of the statement at offset, or None if it is not one.
+
+        let, name, bracket, subscript, closing, equal, first, second, third = (self._tokenizer.peek(offset + i) for i in range(9))
+
+        if not (self.compareToken(let, TYPE.KEYWORD, KEYWORD.LET) and self.compareToken(name, TYPE.IDENTIFIER)
+                and self.compareToken(bracket, TYPE.SYMBOL, SYMBOL.SQUARE_L) and self.compareToken(subscript, TYPE.INT_CONST)
+                and self.compareToken(closing, TYPE.SYMBOL, SYMBOL.SQUARE_R) and self.compareToken(equal, TYPE.SYMBOL, SYMBOL.EQUAL)):
+            return None
+
+        if self.compareToken(second, TYPE.SYMBOL, SYMBOL.SEMICOLON):
+            if first.type is TYPE.INT_CONST:
+                return name.val, subscript.val, first.val, 8
+            elif first.val in (KEYWORD.FALSE, KEYWORD.NULL):
+                return name.val, subscript.val, 0, 8
+            elif first.val is KEYWORD.TRUE:
+                return name.val, subscript.val, -1, 8
+
+        elif self.compareToken(first, TYPE.SYMBOL, SYMBOL.MINUS) and self.compareToken(second, TYPE.INT_CONST) \
+                and self.compareToken(third, TYPE.SYMBOL, SYMBOL.SEMICOLON):
+            return name.val, subscript.val, -second.val, 9
+
+        return None
+
+    def _compileConstantStores(self) -> bool:
+        # A run of constant stores to constant subscripts of one array, such as a lookup table being filled, loads
+        # the array address into pointer 1 once, then writes each value with push constant and pop that.
+        # Returns False, having compiled nothing, if the next statement is not such a store.
+
+        stores = []
+        offset = 0
+
+        while (store := self._constantStore(offset)) is not None and (not stores or store[0] == stores[0][0]):
+            stores.append(store)
+            offset += store[3]
+
+        if not stores or (entry := self._lookupVar(stores[0][0])) is None:
+            return False
+
+        for _, subscript, value, length in stores:
+            for _ in range(length):
+                self.advance()
+
+            self._loadThatPtr((entry[1:], None))
+
+            self.writer.writeConstant(abs(value))
+            if value < 0:
+                self.writer.writeArithmetic(COMMAND.NEG)
+            self.writer.writePop(SEGMENT.THAT, subscript)
+
+        return True
+
+
+    # LOOP INVARIANT METHODS
+    # Invariant expressions are stored in extra locals rather than temp, which calls in the loop may overwrite.
+
+    def _varLocation(self, name):
+        if (entry := self._lookupVar(name)) is None:
+            return None
+
+        return entry[1:]
+
+    def _hoistInvariants(self) -> list[Token]:
+        # Compiles the invariant expressions of the upcoming loop into new locals.
+        # Returns the first tokens of the expressions, which are replaced by the locals until the loop ends.
+
+        tokens = self._blockTokens()
+        hoisted = {}
+
+        from src.LoopInvariants import LoopInvariants
+
+        for start, end, kind in LoopInvariants(tokens, self._varLocation).spans:
+            if tokens[start] in self._hoisted:
+                continue    # already computed before an enclosing loop
+
+            if self.options.conditions and start == 2 and tokens[end].val is SYMBOL.PAREN_R:
+                continue    # the whole condition, which is tested better in place, or not at all if constant
+
+            name = f'$inv{self.methodSymbolTable.varCount(SEGMENT.LOCAL)}'
+            self.methodSymbolTable.define(name, KEYWORD.INT, SEGMENT.LOCAL)
+            location = self._varLocation(name)
+
+            self._tokenizer.insert(tokens[start:end])
+            if kind is NONTERMINAL.TERM:
+                self.compileTerm()
+            else:
+                self.compileExpression()
+            self.writer.writePop(*location)
+
+            hoisted[tokens[start]] = (end - start, kind, location)
+
+        self._hoisted.update(hoisted)
+        return list(hoisted)
+
+    def _compileHoisted(self, kind) -> bool:
+        if not self._hoisted or (hoisted := self._hoisted.get(self._tokenizer.nextToken)) is None:
+            return False
+
+        length, hoistedKind, location = hoisted
+        if hoistedKind is not kind:
+            return False
+
+        for _ in range(length):
+            self.advance()
+
+        self.writer.writePush(*location)
+        return True
+
+
+    # ERROR RECOVERY METHODS
+    # After an error the engine reports it, skips to a token where compilation can resume and carries on,
+    # so that one run finds all errors in a file. Nothing is written for files with errors.
+
+    def _report(self, error):
+        token = error.token or self._tokenizer.currToken
+        line, col = (token.line, token.col) if token is not None else (1, 1)
+        found = f', found {describeToken(error.token)}' if isinstance(error, TokenError) else ''
+
+        self.diagnostics.append(Diagnostic(self.infile, line, col, f'{error}{found}'))
+
+    def _recover(self, stopSet, *, blocks=False):
+        # Skips past the next ';', or up to a '}' or a token in stopSet.
+        # With blocks, the statements in '{' '}' blocks on the way are compiled to check them and keep braces balanced.
+
+        while (token := self._tokenizer.nextToken) is not None:
+            if token.val is SYMBOL.SEMICOLON:
+                self.advance()
+                return
+
+            elif token.val is SYMBOL.CURL_L and blocks:
+                self.advance()
+                self.compileStatements()
+                if self.nextTokenIs(TYPE.SYMBOL, SYMBOL.CURL_R):
+                    self.advance()
+
+            elif token.val is SYMBOL.CURL_R or self.compareTokens(token, stopSet):
+                return
+
+            else:
+                self.advance()
+
+    def _atClassEnd(self):
+        # The class ends at the last token, which should be its '}'
+        return self._tokenizer.nextToken is None or self._tokenizer.peek(1) is None and self.nextTokenIs(TYPE.SYMBOL, SYMBOL.CURL_R)
+
+    def _recoverSubroutine(self):
+        # Skips to the next subroutine declaration or the end of the class
+
+        while not (self._atClassEnd() or self.isSubroutineDec()):
+            self.advance()
@@ -0,0 +1,116 @@
+import queue
+import threading
+import time
+
+class PipelineStats:
+    '''Time spent in each stage of a pipelined run, in seconds'''
+
+    def __init__(self):
+        self.files = 0
+        self.read = 0.0     # reader thread
+        self.compile = 0.0  # main thread
+        self.write = 0.0    # writer thread
+        self.stalled = 0.0  # main thread waiting for a source or for room in the output queue
+        self.wall = 0.0
+
+    @property
+    def overlap(self) -> float:
+        # time saved over doing the three stages one after the other
+        return max(0.0, self.read + self.compile + self.write - self.wall)
+
+    def __str__(self):
+        return (f'pipeline: {self.files} file(s), read {self.read:.3f}s, compile {self.compile:.3f}s, '
+                f'write {self.write:.3f}s, wall {self.wall:.3f}s, overlapped {self.overlap:.3f}s, stalled {self.stalled:.3f}s')
+
+
+class CompilePipeline:
+    '''Compiles files on the calling thread while a reader thread prefetches the next sources and a writer
+    thread flushes finished outputs. Both queues are bounded by depth, so at most depth sources and depth
+    outputs are held in memory at once.'''
+
+    _end = object()
+
+    def __init__(self, depth: int):
+        self.depth = depth
+        self.stats = PipelineStats()
+
+    def run(self, files: list[str], compileSource):
+        # compileSource(infile, source) compiles one file and returns a callable that writes its output
+
+        sources = queue.Queue(self.depth)
+        outputs = queue.Queue(self.depth)
+        writeErrors = []
+        stop = threading.Event()    # set when the main thread leaves early, e.g. on an error
+        start = time.perf_counter()
+
+        reader = threading.Thread(target=self._read, args=(files, sources, stop), daemon=True)
+        writer = threading.Thread(target=self._write, args=(outputs, writeErrors), daemon=True)
+        reader.start()
+        writer.start()
+
+        try:
+            while (item := self._timedStall(sources.get)) is not CompilePipeline._end:
+                infile, source = item
+                if isinstance(source, Exception):
+                    raise source
+
+                compileStart = time.perf_counter()
+                flush = compileSource(infile, source)
+                self.stats.compile += time.perf_counter() - compileStart
+                self.stats.files += 1
+
+                self._timedStall(outputs.put, flush)
+        finally:
+            # the reader may be blocked on a full queue: it gets room for the put it is in, then sees stop
+            stop.set()
+            self._drain(sources)
+            reader.join()
+
+            outputs.put(CompilePipeline._end)
+            writer.join()
+            self.stats.wall = time.perf_counter() - start
+
+        if writeErrors:
+            raise writeErrors[0]
+
+    def _timedStall(self, wait, *args):
+        waitStart = time.perf_counter()
+        result = wait(*args)
+        self.stats.stalled += time.perf_counter() - waitStart
+        return result
+
+    @staticmethod
+    def _drain(items: queue.Queue):
+        try:
+            while True:
+                items.get_nowait()
+        except queue.Empty:
+            pass
+
+    def _read(self, files: list[str], sources: queue.Queue, stop: threading.Event):
+        for infile in files:
+            if stop.is_set():
+                return
+
+            readStart = time.perf_counter()
+            try:
+                with open(infile) as file:
+                    source = file.read()
+            except Exception as error:
+                source = error  # raised on the main thread when it gets to this file
+
+            self.stats.read += time.perf_counter() - readStart
+            sources.put((infile, source))
+
+        if not stop.is_set():
+            sources.put(CompilePipeline._end)
+
+    def _write(self, outputs: queue.Queue, errors: list):
+        while (flush := outputs.get()) is not CompilePipeline._end:
+            writeStart = time.perf_counter()
+            try:
+                flush()
+            except Exception as error:
+                errors.append(error)
+
+            self.stats.write += time.perf_counter() - writeStart
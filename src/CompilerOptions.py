@@ -0,0 +1,39 @@
+class CompilerOptions:
+    '''Switches that change how source files are compiled. All optimizations are off by default.'''
+
+    # options that do not change the generated code
+    driverOptions = {'cacheDir', 'binary', 'pipeline', 'remoteCache', 'stats', 'statsTop', 'sourceMap', 'recursive', 'jobs', 'outputDir'}
+
+    def __init__(self, *, inline=False, arrays=False, hoist=False, conditions=False, tables=False, checkCalls=False, stableLabels=False, cacheDir=None,
+                 binary=False, pipeline=0, remoteCache=None, stats=None, statsTop=10, sourceMap=False,
+                 recursive=False, jobs=None, outputDir=None):
+        self.inline = inline    # expand trivial getters/setters at call sites
+        self.arrays = arrays    # fold constant subscripts, reuse and cache array addresses
+        self.hoist = hoist      # compute loop-invariant expressions once before while loops
+        self.conditions = conditions    # compile if and while conditions to branches rather than values
+        self.tables = tables    # store runs of constants into an array through one pointer 1 load
+        self.checkCalls = checkCalls    # check calls against the interfaces of the project and OS classes
+
+        # number labels per subroutine, so editing one subroutine leaves the others unchanged
+        self.stableLabels = stableLabels or cacheDir is not None
+        self.cacheDir = cacheDir    # directory for compiled subroutines, None for no caching
+
+        self.binary = binary    # write binary .vmb files instead of text .vm files
+        self.pipeline = pipeline    # files read ahead and outputs written behind compilation, 0 to compile one by one
+        self.remoteCache = remoteCache  # address of a shared cache server for whole files, None for no remote cache
+
+        self.stats = stats          # JSON file for code size and stack depth statistics, None for no statistics
+        self.statsTop = statsTop    # functions in the printed statistics table
+
+        self.sourceMap = sourceMap  # write an <output>.map file with the source line of each instruction
+
+        self.recursive = recursive  # compile every project directory under a directory
+        self.jobs = jobs            # projects compiled at once in recursive builds, None for one per CPU
+        self.outputDir = outputDir  # root of a separate tree mirroring the sources for outputs, None to write next to them
+
+    def __repr__(self):
+        return f'CompilerOptions({', '.join(f'{name}={val!r}' for name, val in vars(self).items())})'
+
+    def codegenKey(self) -> str:
+        # The options that change the generated code, for cache keys
+        return repr({name: val for name, val in vars(self).items() if name not in CompilerOptions.driverOptions})
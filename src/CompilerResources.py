@@ -1,6 +1,7 @@
 # These tags are defined so they can be used in place of literals when matching token types, keyword types, etc.
 
 from enum import Enum
+from types import MappingProxyType
 
 
 class TYPE(Enum):
@@ -78,6 +79,7 @@ class NONTERMINAL:
     SUBROUTINE_CALL = 'subroutineCall'
     VAR_DEC = 'varDec'
     STATEMENTS = 'statements'
+    STATEMENT = 'statement'
     LET = 'letStatement'
     IF = 'ifStatement'
     WHILE = 'whileStatement'
@@ -114,40 +116,40 @@ class COMMAND(Enum):
 
 
 class TOKENSET:
-    DATA_TYPES = {
+    DATA_TYPES = frozenset({
         (TYPE.KEYWORD, KEYWORD.INT),
         (TYPE.KEYWORD, KEYWORD.CHAR),
         (TYPE.KEYWORD, KEYWORD.BOOLEAN),
         (TYPE.IDENTIFIER, )
-    }
+    })
 
-    RETURN_TYPES = { (TYPE.KEYWORD, KEYWORD.VOID) } | DATA_TYPES
+    RETURN_TYPES = frozenset({ (TYPE.KEYWORD, KEYWORD.VOID) }) | DATA_TYPES
 
-    CLASS_VAR_DEC = {
+    CLASS_VAR_DEC = frozenset({
         (TYPE.KEYWORD, KEYWORD.STATIC),
         (TYPE.KEYWORD, KEYWORD.FIELD)
-    }
+    })
 
-    SUBROUTINE_DEC = {
+    SUBROUTINE_DEC = frozenset({
         (TYPE.KEYWORD, KEYWORD.CONSTRUCTOR),
         (TYPE.KEYWORD, KEYWORD.FUNCTION),
         (TYPE.KEYWORD, KEYWORD.METHOD)
-    }
+    })
 
-    STATEMENTS = {
+    STATEMENTS = frozenset({
         (TYPE.KEYWORD, KEYWORD.LET),
         (TYPE.KEYWORD, KEYWORD.IF),
         (TYPE.KEYWORD, KEYWORD.WHILE),
         (TYPE.KEYWORD, KEYWORD.DO),
         (TYPE.KEYWORD, KEYWORD.RETURN)
-    }
+    })
 
-    UNARY_OPS = {
+    UNARY_OPS = frozenset({
         (TYPE.SYMBOL, SYMBOL.MINUS),
         (TYPE.SYMBOL, SYMBOL.SQUIGGLE)
-    }
+    })
 
-    OPERATORS = {
+    OPERATORS = frozenset({
         (TYPE.SYMBOL, SYMBOL.PLUS),
         (TYPE.SYMBOL, SYMBOL.MINUS),
         (TYPE.SYMBOL, SYMBOL.STAR),
@@ -157,23 +159,29 @@ class TOKENSET:
         (TYPE.SYMBOL, SYMBOL.LESS_THAN),
         (TYPE.SYMBOL, SYMBOL.GREATER_THAN),
         (TYPE.SYMBOL, SYMBOL.EQUAL)
-    }
+    })
 
-    KEYWORD_CONSTANTS = {
+    KEYWORD_CONSTANTS = frozenset({
         (TYPE.KEYWORD, KEYWORD.TRUE),
         (TYPE.KEYWORD, KEYWORD.FALSE),
         (TYPE.KEYWORD, KEYWORD.NULL),
         (TYPE.KEYWORD, KEYWORD.THIS)
-    }
+    })
 
-    TERMS = {
+    TERMS = frozenset({
         (TYPE.INT_CONST, ),
         (TYPE.STRING_CONST, ),
         (TYPE.IDENTIFIER, ),
         (TYPE.SYMBOL, SYMBOL.PAREN_L),
-    } | KEYWORD_CONSTANTS | UNARY_OPS
+    }) | KEYWORD_CONSTANTS | UNARY_OPS
 
-    SUBROUTINE_CALL = {
+    SUBROUTINE_CALL = frozenset({
         (TYPE.SYMBOL, SYMBOL.PAREN_L),
         (TYPE.SYMBOL, SYMBOL.DOT)
-    }
+    })
+
+
+# Token text -> (type, member) of every keyword and symbol, so the tokenizer classifies a token with one lookup
+RESERVED_TOKENS = MappingProxyType(
+    {keyword.value: (TYPE.KEYWORD, keyword) for keyword in KEYWORD} | {symbol.value: (TYPE.SYMBOL, symbol) for symbol in SYMBOL}
+)
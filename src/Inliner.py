@@ -0,0 +1,218 @@
+from src.JackTokenizer import JackTokenizer, Token
+from src.SymbolTable import SymbolTable
+from src.VMWriter import VMWriter
+from src.CompilerResources import *
+
+
+class InlineBody:
+    '''Body of a trivial subroutine: returns a single value, or stores a single value into a field'''
+
+    def __init__(self, nArgs: int, value: tuple[SEGMENT, int], negate=False, target=None):
+        self.nArgs = nArgs      # includes the object for methods
+        self.value = value      # (ARG | THIS | CONST, index)
+        self.negate = negate
+        self.target = target    # field index for setters, None for getters
+
+    def __repr__(self):
+        return f'{self.nArgs} {self.value} {self.negate} {self.target}'
+
+    def write(self, writer: VMWriter):
+        # Arguments are on the stack in call order. Pop them off top-first, keeping the one the body reads
+        # in temp 1 and the object in pointer 1 so fields can be reached through the that segment.
+
+        source, index = self.value
+        keepArg = index if source is SEGMENT.ARG else None
+        usesThis = source is SEGMENT.THIS or self.target is not None
+
+        if self.nArgs == 1 and keepArg == 0 and not self.negate:
+            return  # value is already on top of the stack
+
+        for arg in reversed(range(self.nArgs)):
+            if arg == 0 and usesThis:
+                writer.writePopThatPtr()
+            elif arg == keepArg:
+                writer.writePop(SEGMENT.TEMP, 1)
+            else:
+                writer.writePop(SEGMENT.TEMP, 0)
+
+        if source is SEGMENT.ARG:
+            writer.writePush(SEGMENT.TEMP, 1)
+        elif source is SEGMENT.THIS:
+            writer.writePush(SEGMENT.THAT, index)
+        else:
+            writer.writeConstant(index)
+
+        if self.negate:
+            writer.writeArithmetic(COMMAND.NEG)
+
+        if self.target is not None:
+            writer.writePop(SEGMENT.THAT, self.target)
+            writer.writeConstant(0) # dummy return value
+
+
+class Inliner:
+    '''Finds trivial subroutines across a set of classes so that calls to them can be expanded in place.
+    The original functions are still compiled as usual for callers outside the compiled set.'''
+
+    def __init__(self, files: list[str], sources=None):
+        # sources: contents of the files if already read, by file name
+        self.bodies: dict[str, InlineBody] = {}
+
+        for infile in files:
+            try:
+                self._scanClass(self._readTokens(infile, sources and sources[infile]))
+            except IndexError:
+                pass    # unterminated class, left for the compilation engine to report
+
+    def expand(self, writer: VMWriter, functionName: str, nArgs: int) -> bool:
+        body = self.bodies.get(functionName)
+
+        if body is None or body.nArgs != nArgs:
+            return False
+
+        body.write(writer)
+        return True
+
+    def _readTokens(self, infile: str, source=None) -> list[Token]:
+        tokenizer = JackTokenizer(infile, source)
+        tokens = []
+
+        while tokenizer.hasMoreTokens():
+            tokens.append(tokenizer.advance())
+
+        return tokens
+
+
+    # SCANNING METHODS
+    # Malformed input is skipped rather than reported, the compilation engine reports it later.
+
+    def _scanClass(self, tokens: list[Token]):
+        # 'class' className '{' classVarDec* subroutineDec* '}'
+
+        if len(tokens) < 3 or tokens[0].val is not KEYWORD.CLASS:
+            return
+
+        className = tokens[1].val
+        fields = SymbolTable(None)
+        pos = 3
+
+        while pos < len(tokens) and tokens[pos].val in (KEYWORD.STATIC, KEYWORD.FIELD):
+            segment = SEGMENT(tokens[pos].val.value)
+            end = self._find(tokens, pos, SYMBOL.SEMICOLON)
+
+            for token in tokens[pos + 2:end:2]:
+                fields.define(token.val, None, segment)
+
+            pos = end + 1
+
+        while pos < len(tokens) and tokens[pos].val in (KEYWORD.CONSTRUCTOR, KEYWORD.FUNCTION, KEYWORD.METHOD):
+            pos = self._scanSubroutine(tokens, pos, className, fields)
+
+    def _scanSubroutine(self, tokens: list[Token], pos: int, className: str, fields: SymbolTable) -> int:
+        # ('constructor' | 'function' | 'method') ('void' | type) subroutineName '(' parameterList ')' subroutineBody
+        # Returns the position after the subroutine.
+
+        subroutineType = tokens[pos].val
+        functionName = f'{className}.{tokens[pos + 2].val}'
+
+        params = SymbolTable(None)
+        if subroutineType is KEYWORD.METHOD:
+            params.defineThisObject(className)
+
+        pos += 4
+        while tokens[pos].val is not SYMBOL.PAREN_R:
+            params.define(tokens[pos + 1].val, tokens[pos].val, SEGMENT.ARG)
+            pos += 3 if tokens[pos + 2].val is SYMBOL.COMMA else 2
+
+        bodyStart = pos + 2
+        bodyEnd = self._findClosingBrace(tokens, pos + 1)
+
+        locals = set()
+        pos = bodyStart
+        while tokens[pos].val is KEYWORD.VAR:
+            end = self._find(tokens, pos, SYMBOL.SEMICOLON)
+            locals.update(token.val for token in tokens[pos + 2:end:2])
+            pos = end + 1
+
+        if subroutineType is not KEYWORD.CONSTRUCTOR:
+            body = self._scanBody(tokens[pos:bodyEnd], subroutineType, params, fields, locals)
+            if body is not None:
+                self.bodies[functionName] = body
+
+        return bodyEnd + 1
+
+    def _scanBody(self, tokens: list[Token], subroutineType: KEYWORD, params: SymbolTable, fields: SymbolTable, locals: set):
+        # 'return' value ';'  |  'let' fieldName '=' value ';' 'return' ';'
+
+        nArgs = params.varCount(SEGMENT.ARG)
+        isMethod = subroutineType is KEYWORD.METHOD
+        vals = [token.val for token in tokens]
+
+        if vals[:1] == [KEYWORD.RETURN] and vals[-1:] == [SYMBOL.SEMICOLON]:
+            value = self._scanValue(tokens[1:-1], isMethod, params, fields, locals)
+            if value is not None:
+                return InlineBody(nArgs, *value)
+
+        elif isMethod and vals[:1] == [KEYWORD.LET] and vals[-3:] == [SYMBOL.SEMICOLON, KEYWORD.RETURN, SYMBOL.SEMICOLON] \
+                and len(vals) > 6 and vals[2] is SYMBOL.EQUAL:
+            name = vals[1]
+            if name in locals or name in params or name not in fields or fields.segmentOf(name) is not SEGMENT.THIS:
+                return None
+
+            value = self._scanValue(tokens[3:-3], isMethod, params, fields, locals)
+            if value is not None and value[0] != (SEGMENT.ARG, 0):
+                return InlineBody(nArgs, *value, target=fields.indexOf(name))
+
+        return None
+
+    def _scanValue(self, tokens: list[Token], isMethod: bool, params: SymbolTable, fields: SymbolTable, locals: set):
+        # integerConstant | '-' integerConstant | keywordConstant | varName
+        # Returns (value, negate) or None.
+
+        vals = [token.val for token in tokens]
+
+        if len(tokens) == 2 and vals[0] is SYMBOL.MINUS and tokens[1].type is TYPE.INT_CONST:
+            return (SEGMENT.CONST, vals[1]), True
+
+        if len(tokens) != 1:
+            return None
+
+        token = tokens[0]
+
+        if token.type is TYPE.INT_CONST:
+            return (SEGMENT.CONST, token.val), False
+
+        elif token.val is KEYWORD.TRUE:
+            return (SEGMENT.CONST, 1), True
+
+        elif token.val in (KEYWORD.FALSE, KEYWORD.NULL):
+            return (SEGMENT.CONST, 0), False
+
+        elif token.val is KEYWORD.THIS and isMethod:
+            return (SEGMENT.ARG, 0), False
+
+        elif token.type is TYPE.IDENTIFIER and token.val not in locals:
+            if token.val in params:
+                return (SEGMENT.ARG, params.indexOf(token.val)), False
+
+            if isMethod and token.val in fields and fields.segmentOf(token.val) is SEGMENT.THIS:
+                return (SEGMENT.THIS, fields.indexOf(token.val)), False
+
+        return None
+
+    def _find(self, tokens: list[Token], pos: int, val: VALUE) -> int:
+        while tokens[pos].val is not val:
+            pos += 1
+        return pos
+
+    def _findClosingBrace(self, tokens: list[Token], pos: int) -> int:
+        depth = 0
+
+        while True:
+            if tokens[pos].val is SYMBOL.CURL_L:
+                depth += 1
+            elif tokens[pos].val is SYMBOL.CURL_R:
+                depth -= 1
+                if depth == 0:
+                    return pos
+            pos += 1
@@ -0,0 +1,155 @@
+import json
+import os
+import re
+
+# The interfaces of the Jack OS classes: subroutine -> (kind, parameters)
+OS_CLASSES = {
+    'Array': {
+        'new': ('function', 1), 'dispose': ('method', 0)
+    },
+    'Keyboard': {
+        'init': ('function', 0), 'keyPressed': ('function', 0), 'readChar': ('function', 0),
+        'readLine': ('function', 1), 'readInt': ('function', 1)
+    },
+    'Math': {
+        'init': ('function', 0), 'abs': ('function', 1), 'multiply': ('function', 2), 'divide': ('function', 2),
+        'min': ('function', 2), 'max': ('function', 2), 'sqrt': ('function', 1)
+    },
+    'Memory': {
+        'init': ('function', 0), 'peek': ('function', 1), 'poke': ('function', 2),
+        'alloc': ('function', 1), 'deAlloc': ('function', 1)
+    },
+    'Output': {
+        'init': ('function', 0), 'moveCursor': ('function', 2), 'printChar': ('function', 1),
+        'printString': ('function', 1), 'printInt': ('function', 1), 'println': ('function', 0),
+        'backSpace': ('function', 0)
+    },
+    'Screen': {
+        'init': ('function', 0), 'clearScreen': ('function', 0), 'setColor': ('function', 1),
+        'drawPixel': ('function', 2), 'drawLine': ('function', 4), 'drawRectangle': ('function', 4),
+        'drawCircle': ('function', 3)
+    },
+    'String': {
+        'new': ('constructor', 1), 'dispose': ('method', 0), 'length': ('method', 0), 'charAt': ('method', 1),
+        'setCharAt': ('method', 2), 'appendChar': ('method', 1), 'eraseLastChar': ('method', 0),
+        'intValue': ('method', 0), 'setInt': ('method', 1),
+        'backSpace': ('function', 0), 'doubleQuote': ('function', 0), 'newLine': ('function', 0)
+    },
+    'Sys': {
+        'init': ('function', 0), 'halt': ('function', 0), 'error': ('function', 1), 'wait': ('function', 1)
+    }
+}
+
+INDEX_VERSION = 1
+
+# Header scan: keywords are reserved, so declarations can be found in the source text without parsing
+# the subroutine bodies, once comments and strings are blanked out.
+_blankPattern = re.compile(r'/\*.*?\*/|//[^\n]*|"[^"\n]*"', re.DOTALL)
+_classPattern = re.compile(r'\bclass\s+(\w+)')
+_varDecPattern = re.compile(r'\b(static|field)\s+\w+\s+([^;]*);')
+_subroutinePattern = re.compile(r'\b(constructor|function|method)\s+\w+\s+(\w+)\s*\(([^)]*)\)')
+
+def scanHeader(source: str) -> dict:
+    # The interface of the class in a source file, an empty dict if it has no class declaration
+    text = _blankPattern.sub(' ', source)
+
+    if (match := _classPattern.search(text)) is None:
+        return {}
+
+    counts = {'static': 0, 'field': 0}
+    for kind, names in _varDecPattern.findall(text):
+        counts[kind] += names.count(',') + 1
+
+    subroutines = {}
+    for kind, name, params in _subroutinePattern.findall(text):
+        subroutines[name] = (kind, params.count(',') + 1 if params.strip() else 0)
+
+    return {'class': match.group(1), 'statics': counts['static'], 'fields': counts['field'], 'subroutines': subroutines}
+
+
+class InterfaceIndex:
+    '''Classes of a project with the kinds and numbers of parameters of their subroutines, and field counts.
+    Built from header scans of the source files, and kept in a file that is updated only for changed files.'''
+
+    fileName = '.jackinterfaces.json'   # index file in a project directory
+
+    def __init__(self, files: list[str], indexFile=None, sources=None):
+        # indexFile: where the index is kept between builds, None to scan every file
+        # sources: contents of the files if already read, by file name
+
+        self.indexFile = indexFile
+        self.scanned = 0
+        entries = self._load() if indexFile else {}
+        updated = {}
+
+        for infile in files:
+            if sources is not None:
+                updated[infile] = scanHeader(sources[infile])
+                continue
+
+            stat = os.stat(infile)
+            version = [stat.st_mtime_ns, stat.st_size]
+
+            if (entry := entries.get(infile)) is not None and entry['version'] == version:
+                updated[infile] = entry
+            else:
+                with open(infile) as file:
+                    updated[infile] = {'version': version, **scanHeader(file.read())}
+                self.scanned += 1
+
+        if indexFile and updated != entries:
+            self._save(updated)
+
+        self.classes = {name: {'subroutines': subroutines} for name, subroutines in OS_CLASSES.items()}
+        for entry in updated.values():
+            if 'class' in entry:
+                self.classes[entry['class']] = entry
+
+    def signature(self, classNames=None) -> list:
+        # Everything the checks of calls to the given classes depend on, by default to any class, for cache keys.
+        # Names of unknown classes are left out, their calls are not checked.
+        names = self.classes.keys() if classNames is None else set(classNames) & self.classes.keys()
+        return sorted((name, sorted(self.classes[name]['subroutines'].items())) for name in names)
+
+    def checkCall(self, className: str, subroutineName: str, nArgs: int, methodCall: bool) -> str:
+        # Error message for a call that does not match the interface of its target, None if it matches
+        # or the class is not known. nArgs includes the object for method calls.
+
+        if (entry := self.classes.get(className)) is None:
+            return None
+
+        if (interface := entry['subroutines'].get(subroutineName)) is None:
+            return f'{className} has no subroutine {subroutineName}'
+
+        kind, nParams = interface
+
+        if methodCall and kind != 'method':
+            return f'{className}.{subroutineName} is a {kind}, call it as {className}.{subroutineName}(...)'
+        elif not methodCall and kind == 'method':
+            return f'{className}.{subroutineName} is a method, call it on an object'
+
+        if (nPassed := nArgs - methodCall) != nParams:
+            return f'{className}.{subroutineName} takes {nParams} argument(s), {nPassed} given'
+
+        return None
+
+    def _load(self) -> dict:
+        try:
+            with open(self.indexFile) as infile:
+                index = json.load(infile)
+        except (FileNotFoundError, ValueError):
+            return {}
+
+        if index.get('version') != INDEX_VERSION:
+            return {}
+
+        return {infile: {**entry, 'subroutines': {name: tuple(interface) for name, interface in entry['subroutines'].items()}}
+                if 'class' in entry else entry for infile, entry in index['files'].items()}
+
+    def _save(self, entries: dict):
+        tmpPath = f'{self.indexFile}.{os.getpid()}.tmp'
+
+        with open(tmpPath, 'w') as outfile:
+            json.dump({'version': INDEX_VERSION, 'files': entries}, outfile)
+
+        os.replace(tmpPath, self.indexFile)
@@ -1,20 +1,303 @@
 from src.CompilationEngine import CompilationEngine
+from src.CompilerOptions import CompilerOptions
 
-import glob
+import os
+import sys
+
+# The modules of optional features are imported where they are used, so that a plain
+# single-file compile does not pay for importing them.
 
 class JackCompiler:
-    def __init__(self):
-        pass
+    def __init__(self, options=None):
+        self.options = options or CompilerOptions()
+
+    def compile(self, sourceFile: str, *, debugFile=None) -> list:
+        # Compiles every file, even after errors in some of them. Returns the diagnostics of all files.
+        # sourceFile is a .jack file, a directory of them, or a zip or tar archive of them. With the recursive
+        # option, a directory is searched for project directories, each compiled as its own unit.
+
+        self._setup()
+
+        if self.options.recursive and os.path.isdir(sourceFile):
+            results = self.compileTree(sourceFile, debugFile)
+        else:
+            results = self.compileUnit(sourceFile, debugFile)
+
+        return self._report(results)
+
+    def _setup(self):
+        self.cache = None
+        self.stats = None
+
+        if self.options.cacheDir:
+            from src.SubroutineCache import SubroutineCache
+            self.cache = SubroutineCache(self.options.cacheDir)
+
+        if self.options.stats:
+            from src.CodeStats import CodeStats
+            self.stats = CodeStats()
+
+    def compileTree(self, root: str, debugFile: str) -> list:
+        # Compiles every project directory under root, several at once in separate processes
+
+        from src.ProjectDiscovery import discoverProjects
+
+        projects = discoverProjects(root)
+        results = []
+
+        if self.options.jobs == 1 or len(projects) < 2:
+            for directory, files in projects:
+                results += self.compileUnit(directory, debugFile, files, root)
+            return results
+
+        from concurrent.futures import ProcessPoolExecutor
+        from itertools import repeat
+
+        with ProcessPoolExecutor(self.options.jobs) as pool:
+            for unitResults, functions, cacheCounts in pool.map(compileProject, repeat(self.options), projects, repeat(root), repeat(debugFile)):
+                results += unitResults
+                if self.stats is not None:
+                    self.stats.functions.update(functions)
+                if self.cache is not None:
+                    self.cache.hits += cacheCounts[0]
+                    self.cache.misses += cacheCounts[1]
+
+        return results
+
+    def compileUnit(self, sourceFile: str, debugFile: str, files=None, root=None) -> list:
+        # Compiles one file, directory or archive. Returns the diagnostics of each file.
+        # files: the .jack files of the directory if already known
+        # root: directory the output tree mirrors, by default the directory of the unit
+
+        self.inliner = None
+        self.interfaces = None
+        self.engine = None
+        self.root = root or (sourceFile if os.path.isdir(sourceFile) else os.path.dirname(sourceFile))
+        self.project = os.path.relpath(sourceFile, root) if root else ''   # name of the unit in statistics
+        results = []
 
-    def compile(self, sourceFile: str, *, debugFile=None):
-        if sourceFile.endswith('.jack'):
-            files = [sourceFile]
+        if files is None:
+            if sourceFile.endswith('.jack'):
+                files = [sourceFile]
+
+            elif os.path.isdir(sourceFile):
+                import glob
+                files = glob.glob(f'{sourceFile}/*.jack')
+
+            else:
+                from src.Archives import isArchive, outputArchiveName
+
+                if isArchive(sourceFile):
+                    self.compileArchive(sourceFile, self._outputPath(outputArchiveName(sourceFile)), debugFile, results)
+                    return results
+
+                files = []
+
+        if self.options.inline:
+            from src.Inliner import Inliner
+            self.inliner = Inliner(files)
+
+        if self.options.checkCalls:
+            self.interfaces = self._interfaceIndex(sourceFile)
+
+        # remote cache entries have no source maps
+        if self.options.remoteCache and not self.options.sourceMap:
+            from src.RemoteCache import openRemoteCache
+            self.remoteCache = openRemoteCache(self.options.remoteCache)
+            try:
+                self.compileRemote(files, debugFile, results)
+            finally:
+                self.remoteCache.close()
+
+            print(f'remote cache: {self.remoteCache.hits} hit(s), {self.remoteCache.misses} miss(es)', file=sys.stderr)
+
+        elif self.options.pipeline:
+            from src.CompilePipeline import CompilePipeline
+            pipeline = CompilePipeline(self.options.pipeline)
+            pipeline.run(files, lambda infile, source: self._compileSource(infile, source, debugFile, results))
+            print(pipeline.stats, file=sys.stderr)
         else:
-            files = glob.glob(f'{sourceFile}/*.jack')
+            for infile in files:
+                results.append(self.compileFile(infile, self.outfileName(infile), debugFile))
 
+        return results
+
+    def compileRemote(self, files: list[str], debugFile: str, results: list):
+        # Looks up all files in the remote cache in one batch, then compiles only those it does not have
+        # and stores their outputs. A cache that fails behaves as if it had no entries, and an entry
+        # that cannot be read as if it were missing.
+
+        from src.RemoteCache import fileKey, packEntry, unpackEntry
+        from src.SymbolTable import SymbolTable
+        from src.VMBytecode import readContents
+
+        sources = {}
         for infile in files:
-            outfile = f'{infile.strip('.jack')}.vm'
-            self.compileFile(infile, outfile, debugFile)
+            with open(infile) as file:
+                sources[infile] = file.read()
+
+        keys = {infile: fileKey(source, self.options, self.inliner, self.interfaces) for infile, source in sources.items()}
+        found = self.remoteCache.fetch(list(keys.values()))
+
+        for infile, source in sources.items():
+            outfile = self.outfileName(infile)
+
+            if (entry := found.get(keys[infile])) is not None:
+                try:
+                    data, dump = unpackEntry(entry)
+                    instructions = list(readContents(data))
+                except (ValueError, UnicodeDecodeError):
+                    entry = None
+                    self.remoteCache.hits -= 1
+                    self.remoteCache.misses += 1
+
+            if entry is not None:
+                with open(outfile, 'wb') as file:
+                    file.write(data)
+
+                SymbolTable(debugFile).writeDump(dump)
+                results.append([])
+                self._addStats(instructions)
+                continue
+
+            engine = self._engine(infile, outfile, debugFile, source=source, deferOutput=True)
+            engine.finishOutput()
+            results.append(engine.diagnostics)
+            self._addStats(engine)
+
+            if not engine.diagnostics:
+                self.remoteCache.store(keys[infile], packEntry(engine.writer.contents(), engine.dumpText()))
+
+    def compileArchive(self, archive: str, outArchive: str, debugFile: str, results: list):
+        # Compiles the .jack members of archive into outArchive without extracting either.
+        # Members are streamed one at a time, except with inlining or call checks, which need all classes
+        # before compiling any.
+
+        from src.Archives import readSources, ArchiveWriter
+
+        sources = readSources(archive)
+
+        if self.options.inline or self.options.checkCalls:
+            sources = dict(sources)
+
+            if self.options.inline:
+                from src.Inliner import Inliner
+                self.inliner = Inliner(list(sources), sources)
+
+            if self.options.checkCalls:
+                from src.InterfaceIndex import InterfaceIndex
+                self.interfaces = InterfaceIndex(list(sources), sources=sources)
+
+            sources = sources.items()
+
+        with ArchiveWriter(outArchive) as output:
+            for name, source in sources:
+                engine = self._engine(f'{archive}/{name}', None, debugFile, source=source, deferOutput=True)
+                results.append(engine.diagnostics)
+                self._addStats(engine)
+
+                if not engine.diagnostics:
+                    outName = f'{name.removesuffix('.jack')}.{'vmb' if self.options.binary else 'vm'}'
+                    output.add(outName, engine.writer.contents())
+
+                    if self.options.sourceMap:
+                        output.add(f'{outName}.map', engine.sourceMap(os.path.basename(name)).contents())
+
+    def _addStats(self, compiled):
+        # compiled: an engine, or the instructions of a file
+        if self.stats is None:
+            return
+
+        if isinstance(compiled, CompilationEngine):
+            if compiled.diagnostics:
+                return
+            compiled = compiled.writer.instructions
+
+        self.stats.add(compiled, self.project)
+
+    def _report(self, results: list) -> list:
+        # Prints the diagnostics of each file and a summary, and the statistics if requested.
+        # Returns the diagnostics as one list.
+
+        if self.stats is not None:
+            import json
+            with open(self.options.stats, 'w') as outfile:
+                json.dump(self.stats.toJson(), outfile, indent=2)
+
+            print(self.stats.table(self.options.statsTop))
+
+        if self.cache is not None:
+            print(f'cache: {self.cache.hits} hit(s), {self.cache.misses} miss(es)', file=sys.stderr)
+
+        diagnostics = [diagnostic for fileDiagnostics in results for diagnostic in fileDiagnostics]
+        nFailed = sum(1 for fileDiagnostics in results if fileDiagnostics)
+
+        for diagnostic in diagnostics:
+            print(diagnostic, file=sys.stderr)
+
+        if diagnostics:
+            print(f'{len(diagnostics)} error(s) in {nFailed} of {len(results)} file(s)', file=sys.stderr)
+
+        return diagnostics
+
+    def outfileName(self, infile: str) -> str:
+        return self._outputPath(f'{infile.removesuffix('.jack')}.{'vmb' if self.options.binary else 'vm'}')
+
+    def _outputPath(self, path: str) -> str:
+        # Moves an output path next to the sources into the output tree, if there is one
+        if self.options.outputDir is None:
+            return path
+
+        outPath = os.path.join(self.options.outputDir, os.path.relpath(path, self.root or '.'))
+        os.makedirs(os.path.dirname(outPath), exist_ok=True)
+        return outPath
+
+    def compileFile(self, infile: str, outfile: str, debugFile: str) -> list:
+        engine = self._engine(infile, outfile, debugFile)
+        self._addStats(engine)
+        return engine.diagnostics
+
+    def _compileSource(self, infile: str, source: str, debugFile: str, results: list):
+        # Compiles a file read by the pipeline, and returns the write of its output for the writer thread
+        engine = self._engine(infile, self.outfileName(infile), debugFile, source=source, deferOutput=True, reuse=False)
+        results.append(engine.diagnostics)
+        self._addStats(engine)
+        return engine.finishOutput
+
+    def _engine(self, infile: str, outfile: str, debugFile: str, *, reuse=True, **kwargs) -> CompilationEngine:
+        # Compiles a file with the engine of the unit, which is reused for all its files.
+        # Files whose output is finished after the next one has started need an engine of their own.
+
+        if not reuse:
+            return CompilationEngine(infile, outfile, debugFile, self.options, self.inliner, self.cache,
+                                     interfaces=self.interfaces, **kwargs)
+
+        if self.engine is None:
+            self.engine = CompilationEngine(None, None, debugFile, self.options, self.inliner, self.cache,
+                                            interfaces=self.interfaces)
+
+        self.engine.compileFile(infile, outfile, **kwargs)
+        return self.engine
+
+    def _interfaceIndex(self, sourceFile: str):
+        # Index of the classes in the directory of the build, kept between builds next to the outputs, so that
+        # with an output tree nothing is written into the sources
+        from src.InterfaceIndex import InterfaceIndex
+        import glob
+
+        directory = sourceFile if os.path.isdir(sourceFile) else os.path.dirname(sourceFile) or '.'
+        return InterfaceIndex(glob.glob(f'{directory}/*.jack'), self._outputPath(os.path.join(directory, InterfaceIndex.fileName)))
+
+
+def compileProject(options: CompilerOptions, project: tuple[str, list[str]], root: str, debugFile: str):
+    # Compiles one project directory of a tree in a worker process.
+    # Returns the diagnostics of each file, the statistics of its functions if requested, and the hits and misses
+    # of the subroutine cache.
+
+    compiler = JackCompiler(options)
+    compiler._setup()
+    directory, files = project
+    results = compiler.compileUnit(directory, debugFile, files, root)
 
-    def compileFile(self, infile: str, outfile: str, debugFile: str):
-        CompilationEngine(infile, outfile, debugFile)
+    cacheCounts = (compiler.cache.hits, compiler.cache.misses) if compiler.cache is not None else (0, 0)
+    return results, compiler.stats.functions if compiler.stats is not None else None, cacheCounts
@@ -1,36 +1,49 @@
-from src.CompilerResources import TYPE, VALUE, KEYWORD, SYMBOL
+from src.CompilerResources import TYPE, VALUE, KEYWORD, SYMBOL, RESERVED_TOKENS
 from utils.ArrayDeque import ArrayDeque
 
 import re
 
 class Token:
-    def __init__(self, type: TYPE, val: VALUE):
+    def __init__(self, type: TYPE, val: VALUE, line=None, col=None):
         self.type = type
         self.val = val
+        self.line = line
+        self.col = col
 
 class JackTokenizer:
     regexTokenPattern = re.compile(r'''
-        \d+                         # integer constants
+        (?P<comment> /\*.*?\*/ | //[^\n]* )
         |
-        ".*?"                       # string constants
+        (?P<token>
+            \d+                         # integer constants
+            |
+            "[^"\n]*"                   # string constants
+            |
+            [{}()\[\].,;+\-*/&|<>=~]    # symbols
+            |
+            [a-zA-Z_]\w*                # identifiers
+        )
         |
-        [{}()\[\].,;+\-*/&|<>=~]    # symbols
-        |
-        [a-zA-Z_]\w*                # identifiers
-    ''', re.VERBOSE)
+        (?P<error> /\* | "[^"\n]* | \S )   # unterminated comment or string, unknown character
+    ''', re.VERBOSE | re.DOTALL)
+
+    def __init__(self, filename, source=None):
+        # source: contents of the file if already read
 
-    def __init__(self, filename):
-        with open(filename) as infile:
-            self._data = infile.read()
         self._tokens = ArrayDeque()
+        self._positions = []
+        self.reset(filename, source)
+
+    def reset(self, filename, source=None):
+        # Tokenizes another file, reusing the token queue
+        if source is None:
+            with open(filename) as infile:
+                source = infile.read()
 
-        self.tokenizeMap = {
-            TYPE.KEYWORD: self.keyword,
-            TYPE.SYMBOL: self.symbol,
-            TYPE.IDENTIFIER: self.identifier,
-            TYPE.INT_CONST: self.intVal,
-            TYPE.STRING_CONST: self.stringVal
-        }
+        self._data = source
+        self._tokens.clear()
+        self._positions.clear()
+        self.errors: list[tuple[int, int, str]] = []  # (line, column, message)
 
         self._matchTokens()
         self._tokenize()
@@ -41,7 +54,7 @@ class JackTokenizer:
 
     @property
     def nextToken(self) -> Token:
-        return self._tokens.first()
+        return None if self._tokens.isEmpty() else self._tokens.first()
 
     def hasMoreTokens(self):
         return not self._tokens.isEmpty()
@@ -51,38 +64,61 @@ class JackTokenizer:
             self.currToken = self._tokens.dequeueFirst()
             return self.currToken
 
+    def peek(self, offset: int) -> Token:
+        return self._tokens[offset] if offset < len(self._tokens) else None
+
+    def insert(self, tokens: list[Token]):
+        # Puts tokens in front of the remaining ones, so that they are read next
+        for token in reversed(tokens):
+            self._tokens.enqueueFirst(token)
+
     def peekSecond(self) -> Token:
-        firstToken = self._tokens.dequeueFirst()
-        secondToken = self._tokens.first()
-        self._tokens.enqueueFirst(firstToken)
-        return secondToken
+        return self.peek(1)
 
     def _matchTokens(self):
-        self._removeComments()
-        data = JackTokenizer.regexTokenPattern.findall(self._data)
+        line = 1
+        lineStart = 0
+        scanned = 0
+
+        for match in JackTokenizer.regexTokenPattern.finditer(self._data):
+            start = match.start()
 
-        for elem in data:
-            self._tokens.enqueueLast(elem)
+            if newlines := self._data.count('\n', scanned, start):
+                line += newlines
+                lineStart = self._data.rfind('\n', 0, start) + 1
+            scanned = start
 
-    def _removeComments(self):
-        self._data = re.sub(r'/\*.*?\*/', '', self._data, flags=re.DOTALL)
-        self._data = re.sub(r'//.*', '', self._data)
+            if match.lastgroup == 'token':
+                self._tokens.enqueueLast(match.group())
+                self._positions.append((line, start - lineStart + 1))
+
+            elif match.lastgroup == 'error':
+                self.errors.append((line, start - lineStart + 1, self._describeError(match.group())))
+
+    def _describeError(self, text: str) -> str:
+        if text == '/*':
+            return 'Unterminated comment'
+        elif text.startswith('"'):
+            return 'Unterminated string constant'
+
+        return f'Unexpected character: {text}'
     
     def _tokenize(self):
-        for i in range(len(self._tokens)):
+        for line, col in self._positions:
             tokenVal = self.advance()
 
             tokenType = self.tokenType()
-            tokenVal = self.tokenizeMap[tokenType]()
+            tokenVal = JackTokenizer.tokenizeMap[tokenType](self)
 
-            token = Token(tokenType, tokenVal)
+            token = Token(tokenType, tokenVal, line, col)
             self._tokens.enqueueLast(token)
 
+        self._positions.clear()
+        self.currToken = None
+
     def tokenType(self) -> TYPE:
-        if (token := self._currTokenVal) in KEYWORD:
-            return TYPE.KEYWORD
-        elif token in SYMBOL:
-            return TYPE.SYMBOL
+        if (reserved := RESERVED_TOKENS.get(token := self._currTokenVal)) is not None:
+            return reserved[0]
         elif token.isdigit():
             return TYPE.INT_CONST
         elif token.startswith('"'):
@@ -94,13 +130,13 @@ class JackTokenizer:
         if self.tokenType() != TYPE.KEYWORD:
             raise TypeError('Not a keyword token')
         
-        return KEYWORD(self._currTokenVal)
+        return RESERVED_TOKENS[self._currTokenVal][1]
     
     def symbol(self) -> SYMBOL:
         if self.tokenType() != TYPE.SYMBOL:
             raise TypeError('Not a symbol token')
 
-        return SYMBOL(self._currTokenVal)
+        return RESERVED_TOKENS[self._currTokenVal][1]
     
     def identifier(self) -> str:
         if self.tokenType() != TYPE.IDENTIFIER:
@@ -119,3 +155,12 @@ class JackTokenizer:
             raise TypeError('Not a string token')
         
         return self._currTokenVal.strip('"')
+
+    # token type -> value method, built once for the class
+    tokenizeMap = {
+        TYPE.KEYWORD: keyword,
+        TYPE.SYMBOL: symbol,
+        TYPE.IDENTIFIER: identifier,
+        TYPE.INT_CONST: intVal,
+        TYPE.STRING_CONST: stringVal
+    }
@@ -0,0 +1,191 @@
+from src.JackTokenizer import Token
+from src.CompilerResources import *
+
+
+class LoopInvariants:
+    '''Finds the largest side-effect-free expressions in a while loop whose value cannot change while it runs.
+
+    Locals and arguments are invariant unless the loop assigns them. Fields and statics are also invariant
+    unless the loop assigns them, calls a subroutine or stores into an array. Array elements, calls, string
+    constants and division (which may fail) are never invariant.'''
+
+    def __init__(self, tokens: list[Token], resolve):
+        # tokens: 'while' '(' expression ')' '{' statements '}'
+        # resolve: varName -> (segment, index) or None
+
+        self.tokens = tokens
+        self.resolve = resolve
+        self.spans: list[tuple[int, int, str]] = []  # (start, end, NONTERMINAL.TERM | NONTERMINAL.EXPRESSION)
+
+        try:
+            self._findWrites()
+            self._statement(0)
+        except (IndexError, ValueError):
+            self.spans = []  # malformed loop, reported when it is compiled
+
+    def _val(self, pos: int):
+        return self.tokens[pos].val
+
+    def _findWrites(self):
+        self.written = set()
+        self.memoryWritten = False
+
+        for pos, token in enumerate(self.tokens[:-1]):
+            nextVal = self._val(pos + 1)
+
+            if token.val is KEYWORD.LET:
+                self.written.add(self.resolve(nextVal))
+                if self._val(pos + 2) is SYMBOL.SQUARE_L:
+                    self.memoryWritten = True
+
+            elif token.type is TYPE.IDENTIFIER and nextVal in (SYMBOL.PAREN_L, SYMBOL.DOT):
+                self.memoryWritten = True
+
+    def _isInvariantVar(self, name: str) -> bool:
+        location = self.resolve(name)
+
+        if location is None or location in self.written:
+            return False
+
+        return location[0] in (SEGMENT.LOCAL, SEGMENT.ARG) or not self.memoryWritten
+
+    def _addSpan(self, start: int, end: int, kind: str):
+        # Only worth a local if it reads a variable or applies a binary operator. A single variable is already
+        # one push, and a constant such as true or -1 saves one instruction per iteration for a push and a pop
+        # before the loop, which loops that run once or not at all pay for.
+
+        values = [token.val for token in self.tokens[start:end] if token.val not in (SYMBOL.PAREN_L, SYMBOL.PAREN_R)]
+
+        if len(values) > 1 and self._computes(start, end):
+            self.spans.append((start, end, kind))
+
+    def _computes(self, start: int, end: int) -> bool:
+        for pos in range(start, end):
+            token = self.tokens[pos]
+
+            if token.type is TYPE.IDENTIFIER:
+                return True
+
+            # an operator right after the end of a term is binary
+            previous = self.tokens[pos - 1]
+            if pos > start and (TYPE.SYMBOL, token.val) in TOKENSET.OPERATORS and \
+                    (previous.type in (TYPE.INT_CONST, TYPE.KEYWORD) or previous.val is SYMBOL.PAREN_R):
+                return True
+
+        return False
+
+
+    # PARSING METHODS
+    # Each returns the position after the parsed element, expressions and terms also whether they are invariant.
+
+    def _statements(self, pos: int) -> int:
+        # '{' statements '}'
+
+        pos += 1
+        while self._val(pos) is not SYMBOL.CURL_R:
+            pos = self._statement(pos)
+
+        return pos + 1
+
+    def _statement(self, pos: int) -> int:
+        keyword = self._val(pos)
+
+        if keyword is KEYWORD.LET:
+            pos += 2
+            if self._val(pos) is SYMBOL.SQUARE_L:
+                pos = self._topExpression(pos + 1) + 1
+            return self._topExpression(pos + 1) + 1
+
+        elif keyword in (KEYWORD.IF, KEYWORD.WHILE):
+            pos = self._statements(self._topExpression(pos + 2) + 1)
+            if keyword is KEYWORD.IF and pos < len(self.tokens) and self._val(pos) is KEYWORD.ELSE:
+                pos = self._statements(pos + 1)
+            return pos
+
+        elif keyword is KEYWORD.DO:
+            return self._term(pos + 1)[0] + 1
+
+        elif keyword is KEYWORD.RETURN:
+            if self._val(pos + 1) is SYMBOL.SEMICOLON:
+                return pos + 2
+            return self._topExpression(pos + 1) + 1
+
+        raise ValueError(f'Not a statement: {keyword}')
+
+    def _topExpression(self, pos: int) -> int:
+        end, invariant = self._expression(pos)
+
+        if invariant:
+            self._addSpan(pos, end, NONTERMINAL.EXPRESSION)
+
+        return end
+
+    def _expression(self, pos: int) -> tuple[int, bool]:
+        # term ( op term )*
+        # Operators associate to the left, so an invariant expression can only be a prefix or a single term.
+
+        start = pos
+        pos, invariant = self._term(pos)
+        prefixEnd = pos if invariant else None
+        nTerms = 1
+
+        while self.tokens[pos].type is TYPE.SYMBOL and (TYPE.SYMBOL, self._val(pos)) in TOKENSET.OPERATORS:
+            op = self._val(pos)
+            termStart = pos + 1
+            pos, termInvariant = self._term(termStart)
+
+            if invariant and termInvariant and op is not SYMBOL.SLASH:
+                prefixEnd = pos
+                nTerms += 1
+                continue
+
+            if invariant:
+                self._addSpan(start, prefixEnd, NONTERMINAL.EXPRESSION if nTerms > 1 else NONTERMINAL.TERM)
+                invariant = False
+
+            if termInvariant:
+                self._addSpan(termStart, pos, NONTERMINAL.TERM)
+
+        return pos, invariant
+
+    def _term(self, pos: int) -> tuple[int, bool]:
+        token = self.tokens[pos]
+
+        if token.type is TYPE.INT_CONST:
+            return pos + 1, True
+
+        elif token.type is TYPE.STRING_CONST:
+            return pos + 1, False
+
+        elif token.type is TYPE.KEYWORD and (TYPE.KEYWORD, token.val) in TOKENSET.KEYWORD_CONSTANTS:
+            return pos + 1, True
+
+        elif token.val is SYMBOL.PAREN_L:
+            end, invariant = self._expression(pos + 1)
+            return end + 1, invariant
+
+        elif token.type is TYPE.SYMBOL and (TYPE.SYMBOL, token.val) in TOKENSET.UNARY_OPS:
+            return self._term(pos + 1)
+
+        elif token.type is TYPE.IDENTIFIER:
+            nextVal = self._val(pos + 1)
+
+            if nextVal is SYMBOL.SQUARE_L:
+                return self._topExpression(pos + 2) + 1, False
+
+            elif nextVal in (SYMBOL.PAREN_L, SYMBOL.DOT):
+                return self._expressionList(pos + (4 if nextVal is SYMBOL.DOT else 2)), False
+
+            return pos + 1, self._isInvariantVar(token.val)
+
+        raise ValueError(f'Not a term: {token.val}')
+
+    def _expressionList(self, pos: int) -> int:
+        # ( expression ( ',' expression )* )? ')'
+
+        while self._val(pos) is not SYMBOL.PAREN_R:
+            pos = self._topExpression(pos)
+            if self._val(pos) is SYMBOL.COMMA:
+                pos += 1
+
+        return pos + 1
@@ -0,0 +1,41 @@
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+
+import os
+
+def _scanDirectory(directory: str) -> tuple[str, list[str], list[str]]:
+    # (directory, its .jack files, its subdirectories), skipping hidden entries and not following symlinks
+    files = []
+    subdirectories = []
+
+    with os.scandir(directory) as entries:
+        for entry in entries:
+            if entry.name.startswith('.'):
+                continue
+            elif entry.is_dir(follow_symlinks=False):
+                subdirectories.append(entry.path)
+            elif entry.name.endswith('.jack') and entry.is_file():
+                files.append(entry.path)
+
+    return directory, sorted(files), subdirectories
+
+def discoverProjects(root: str, workers=8) -> list[tuple[str, list[str]]]:
+    # (directory, .jack files) of every directory under root that has .jack files, sorted by directory.
+    # Directories are listed by several threads at once, which hides the latency of network file systems.
+
+    projects = []
+
+    with ThreadPoolExecutor(workers) as pool:
+        pending = {pool.submit(_scanDirectory, root)}
+
+        while pending:
+            done, pending = wait(pending, return_when=FIRST_COMPLETED)
+
+            for future in done:
+                directory, files, subdirectories = future.result()
+
+                if files:
+                    projects.append((directory, files))
+
+                pending.update(pool.submit(_scanDirectory, subdirectory) for subdirectory in subdirectories)
+
+    return sorted(projects)
@@ -0,0 +1,293 @@
+from src.SubroutineCache import SubroutineCache
+
+from abc import ABC, abstractmethod
+
+import os
+import re
+import socket
+import socketserver
+import sys
+import threading
+
+# Protocol, over one TCP or Unix socket connection reused for any number of requests:
+#   'GET' key*\n              ->  per key, in order: 'HIT' size\n followed by size bytes, or 'MISS'\n
+#   'PUT' key size\n bytes    ->  'OK'\n
+# Keys are sha256 hex digests of a source file and everything else its output depends on.
+# Values are entries made by packEntry: the compiled file and the dump of its symbol tables.
+# Anything else is answered with 'ERR'\n and the connection is closed.
+
+CACHE_VERSION = 2       # changed whenever the compiler's output or the entry layout changes for the same source and options
+BATCH_SIZE = 256        # keys per GET
+MAX_LINE = 1 << 16
+
+keyPattern = re.compile(rb'[0-9a-f]{64}')
+
+def fileKey(source: str, options, inliner, interfaces) -> str:
+    return SubroutineCache.key(
+        CACHE_VERSION,
+        source,
+        options.codegenKey(),
+        options.binary,
+        sorted(inliner.bodies.items()) if inliner else None,
+        interfaces.signature() if interfaces else None
+    )
+
+def packEntry(output: bytes, dump: str) -> bytes:
+    # 'DUMP' size\n, the symbol table dump in size bytes, then the compiled file
+    dump = dump.encode()
+    return f'DUMP {len(dump)}\n'.encode() + dump + output
+
+def unpackEntry(data: bytes) -> tuple[bytes, str]:
+    # (compiled file, symbol table dump); raises ValueError if data was not made by packEntry
+    header, _, rest = data.partition(b'\n')
+    tag, size = header.split()
+    if tag != b'DUMP' or not size.isdigit() or int(size) > len(rest):
+        raise ValueError('Malformed cache entry')
+
+    return rest[int(size):], rest[:int(size)].decode()
+
+def _connect(address: str, timeout=None) -> socket.socket:
+    # address: 'host:port' or 'unix:path'
+    if address.startswith('unix:'):
+        sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        sock.settimeout(timeout)
+        sock.connect(address.removeprefix('unix:'))
+        return sock
+
+    host, port = address.rsplit(':', 1)
+    return socket.create_connection((host, int(port)), timeout)
+
+
+class RemoteCache(ABC):
+    '''Shared cache of compiled files, keyed by fileKey. Implementations report failures as misses,
+    so that the compiler falls back to compiling locally, and count hits and misses for the driver to report.'''
+
+    def __init__(self):
+        self.hits = 0
+        self.misses = 0
+
+    @abstractmethod
+    def fetch(self, keys: list[str]) -> dict[str, bytes]:
+        # The entries found, by key
+        ...
+
+    @abstractmethod
+    def store(self, key: str, data: bytes):
+        ...
+
+    @abstractmethod
+    def close(self):
+        ...
+
+
+class SocketCache(RemoteCache):
+    '''Client of a cache server. The connection is opened on first use and kept for later requests.
+    After any error the cache is disabled for the rest of the run.'''
+
+    def __init__(self, address: str, timeout=5.0):
+        super().__init__()
+        self.address = address
+        self.timeout = timeout
+        self.failed = False
+
+        self._socket = None
+        self._file = None
+
+    def fetch(self, keys: list[str]) -> dict[str, bytes]:
+        found = {}
+
+        for start in range(0, len(keys), BATCH_SIZE):
+            batch = keys[start:start + BATCH_SIZE]
+            found.update(self._request(self._fetchBatch, batch) or {})
+
+        self.hits += len(found)
+        self.misses += len(keys) - len(found)
+        return found
+
+    def store(self, key: str, data: bytes):
+        self._request(self._storeOne, key, data)
+
+    def close(self):
+        if self._socket is not None:
+            self._file.close()
+            self._socket.close()
+            self._socket = self._file = None
+
+    def _request(self, send, *args):
+        if self.failed:
+            return None
+
+        try:
+            if self._socket is None:
+                self._socket = _connect(self.address, self.timeout)
+                self._file = self._socket.makefile('rwb')
+
+            return send(*args)
+        except (OSError, ValueError, IndexError) as error:
+            print(f'remote cache {self.address} unavailable, compiling locally: {error}', file=sys.stderr)
+            self.failed = True
+            self.close()
+            return None
+
+    def _fetchBatch(self, keys: list[str]) -> dict[str, bytes]:
+        self._file.write(f'GET {' '.join(keys)}\n'.encode())
+        self._file.flush()
+
+        found = {}
+        for key in keys:
+            reply = self._file.readline(MAX_LINE).split()
+
+            if reply[0] == b'HIT':
+                found[key] = self._readExactly(int(reply[1]))
+            elif reply[0] != b'MISS':
+                raise ValueError(f'Unexpected reply: {reply}')
+
+        return found
+
+    def _storeOne(self, key: str, data: bytes):
+        self._file.write(f'PUT {key} {len(data)}\n'.encode())
+        self._file.write(data)
+        self._file.flush()
+
+        reply = self._file.readline(MAX_LINE).split()
+        if reply != [b'OK']:
+            raise ValueError(f'Unexpected reply: {reply}')
+
+    def _readExactly(self, size: int) -> bytes:
+        data = self._file.read(size)
+        if len(data) != size:
+            raise ValueError('Connection closed during reply')
+
+        return data
+
+
+class DirectoryCache(RemoteCache):
+    '''Cache in a directory shared between machines, such as on a network file system, one file per key'''
+
+    def __init__(self, address: str):
+        # address: 'dir:path'
+        super().__init__()
+        self._store = CacheStore(address.removeprefix('dir:'))
+
+    def fetch(self, keys: list[str]) -> dict[str, bytes]:
+        found = {}
+
+        for key in keys:
+            try:
+                if (data := self._store.get(key)) is not None:
+                    found[key] = data
+            except OSError:
+                pass
+
+        self.hits += len(found)
+        self.misses += len(keys) - len(found)
+        return found
+
+    def store(self, key: str, data: bytes):
+        try:
+            self._store.put(key, data)
+        except OSError as error:
+            print(f'remote cache directory unavailable: {error}', file=sys.stderr)
+
+    def close(self):
+        pass
+
+
+# address scheme -> backend; addresses without a registered scheme are 'host:port' of a cache server
+cacheBackends = {
+    'unix': SocketCache,
+    'dir': DirectoryCache
+}
+
+def openRemoteCache(address: str) -> RemoteCache:
+    # The backend for a --remote-cache address: 'host:port', 'unix:path', 'dir:path' or a registered scheme
+    scheme = address.split(':', 1)[0]
+    return cacheBackends.get(scheme, SocketCache)(address)
+
+
+class CacheStore:
+    '''Entries of the reference server, in memory or as one file per key in a directory'''
+
+    def __init__(self, directory=None):
+        self.directory = directory
+        self._entries = {}
+        self._lock = threading.Lock()
+
+        if directory is not None:
+            os.makedirs(directory, exist_ok=True)
+
+    def get(self, key: str) -> bytes:
+        if self.directory is None:
+            with self._lock:
+                return self._entries.get(key)
+
+        try:
+            with open(os.path.join(self.directory, key), 'rb') as infile:
+                return infile.read()
+        except FileNotFoundError:
+            return None
+
+    def put(self, key: str, data: bytes):
+        if self.directory is None:
+            with self._lock:
+                self._entries[key] = data
+            return
+
+        path = os.path.join(self.directory, key)
+        tmpPath = f'{path}.{threading.get_ident()}.tmp'
+
+        with open(tmpPath, 'wb') as outfile:
+            outfile.write(data)
+
+        os.replace(tmpPath, path)
+
+
+class CacheRequestHandler(socketserver.StreamRequestHandler):
+    '''Serves the requests of one client connection until it is closed'''
+
+    def handle(self):
+        store = self.server.store
+
+        while line := self.rfile.readline(MAX_LINE):
+            command, *args = line.split() or [b'']
+
+            if command == b'GET' and all(keyPattern.fullmatch(key) for key in args):
+                for key in args:
+                    data = store.get(key.decode())
+                    self.wfile.write(b'MISS\n' if data is None else b'HIT %d\n%s' % (len(data), data))
+
+            elif command == b'PUT' and len(args) == 2 and keyPattern.fullmatch(args[0]) and args[1].isdigit():
+                data = self.rfile.read(int(args[1]))
+                if len(data) != int(args[1]):
+                    return
+
+                store.put(args[0].decode(), data)
+                self.wfile.write(b'OK\n')
+
+            else:
+                self.wfile.write(b'ERR\n')
+                return
+
+            self.wfile.flush()
+
+
+class _ReusableTCPServer(socketserver.ThreadingTCPServer):
+    allow_reuse_address = True  # restart on the same port without waiting for old connections to time out
+
+
+def makeServer(address: str, directory=None) -> socketserver.BaseServer:
+    # Reference cache server on 'host:port' or 'unix:path', one thread per connection
+
+    if address.startswith('unix:'):
+        path = address.removeprefix('unix:')
+        if os.path.exists(path):
+            os.remove(path)  # left over from an earlier server
+
+        server = socketserver.ThreadingUnixStreamServer(path, CacheRequestHandler)
+    else:
+        host, port = address.rsplit(':', 1)
+        server = _ReusableTCPServer((host, int(port)), CacheRequestHandler)
+
+    server.daemon_threads = True
+    server.store = CacheStore(directory)
+    return server
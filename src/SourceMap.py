@@ -0,0 +1,66 @@
+from collections import Counter
+from bisect import bisect_right
+
+import os
+
+# Sidecar file <output>.map, e.g. Main.vm.map:
+#   source <path of the .jack file, relative to the map>
+#   <instruction index> <line>     one per instruction where the source line changes, in order
+# Instruction indices count every command in the output file from 0, labels and function declarations included,
+# so in a text .vm file the index is the line number minus one.
+
+class SourceMap:
+    '''Jack source line of each instruction of a compiled file'''
+
+    def __init__(self, source: str, marks: list[tuple[int, int]]):
+        self.source = source    # path of the .jack file, relative to the map file
+        self.marks = marks      # (first instruction index, source line)
+        self._indices = [index for index, _ in marks]
+
+    def contents(self) -> bytes:
+        return ''.join([f'source {self.source}\n'] + [f'{index} {line}\n' for index, line in self.marks]).encode()
+
+    def write(self, path: str):
+        with open(path, 'wb') as outfile:
+            outfile.write(self.contents())
+
+    @staticmethod
+    def read(path: str):
+        with open(path) as infile:
+            source = infile.readline().removeprefix('source ').rstrip('\n')
+            marks = [tuple(map(int, line.split())) for line in infile if line.strip()]
+
+        return SourceMap(source, marks)
+
+    def lineOf(self, index: int) -> int:
+        pos = bisect_right(self._indices, index) - 1
+        return self.marks[pos][1] if pos >= 0 else None
+
+    def profile(self, counts: dict[int, int]) -> Counter:
+        # Execution counts per instruction index -> per source line
+        lineCounts = Counter()
+
+        for index, count in counts.items():
+            if (line := self.lineOf(index)) is not None:
+                lineCounts[line] += count
+
+        return lineCounts
+
+
+def readCounts(path: str) -> dict[int, int]:
+    # One count per line in instruction order, or 'index count' per line
+    counts = {}
+
+    with open(path) as infile:
+        for index, line in enumerate(line for line in infile if line.strip()):
+            fields = line.split()
+            if len(fields) == 2:
+                counts[int(fields[0])] = int(fields[1])
+            else:
+                counts[index] = int(fields[0])
+
+    return counts
+
+def mapSourceName(infile: str, outfile: str) -> str:
+    # How the map of outfile refers to infile
+    return os.path.relpath(infile, os.path.dirname(outfile) or '.')
@@ -0,0 +1,67 @@
+from src.VMWriter import formatInstruction, parseInstruction
+
+import hashlib
+import os
+
+class SubroutineCache:
+    '''Compiled VM code of single subroutines, stored as one file per key in a directory'''
+
+    FORMAT = 2      # part of every key, so entries written in an older layout are never read
+
+    def __init__(self, directory: str):
+        self.directory = directory
+        self.hits = 0
+        self.misses = 0
+
+        os.makedirs(directory, exist_ok=True)
+
+    @staticmethod
+    def key(*parts) -> str:
+        digest = hashlib.sha256(f'{SubroutineCache.FORMAT}\0'.encode())
+
+        for part in parts:
+            digest.update(repr(part).encode())
+            digest.update(b'\0')
+
+        return digest.hexdigest()
+
+    # An entry is the VM code of the subroutine, preceded by a comment with its line marks and by the
+    # dump of its symbol table, one comment line per line of the dump:
+    #   // lines index:line ...     lines relative to the first line of the subroutine
+    #   // <symbol table dump>
+
+    def get(self, key: str) -> tuple[list[tuple], list[tuple[int, int]], str]:
+        # (instructions, line marks, symbol table dump) or None
+        try:
+            with open(self._path(key)) as infile:
+                header = infile.readline()
+                lines = infile.read().splitlines()
+        except FileNotFoundError:
+            self.misses += 1
+            return None
+
+        lineMarks = [tuple(map(int, mark.split(':'))) for mark in header.split()[2:]]
+        nDump = next((i for i, line in enumerate(lines) if not line.startswith('//')), len(lines))
+        dump = '\n'.join(line[3:] for line in lines[:nDump])
+        instructions = [parseInstruction(line) for line in lines[nDump:]]
+
+        self.hits += 1
+        return instructions, lineMarks, dump
+
+    def put(self, key: str, instructions: list[tuple], lineMarks: list[tuple[int, int]], dump: str):
+        path = self._path(key)
+        tmpPath = f'{path}.{os.getpid()}.tmp'
+
+        with open(tmpPath, 'w') as outfile:
+            print(' '.join(['// lines'] + [f'{index}:{line}' for index, line in lineMarks]), file=outfile)
+
+            for line in dump.splitlines():
+                print(f'// {line}', file=outfile)
+
+            for instruction in instructions:
+                print(formatInstruction(instruction), file=outfile)
+
+        os.replace(tmpPath, path)   # readers never see a partly written entry
+
+    def _path(self, key: str) -> str:
+        return os.path.join(self.directory, f'{key}.vm')
@@ -1,20 +1,26 @@
 from src.CompilerResources import SEGMENT, KEYWORD
 
+from typing import NamedTuple
+
 class SymbolTable:
-    class Entry:
-        def __init__(self, type: str, segment: SEGMENT, index: int):
-            self.type = type
-            self.segment = segment
-            self.index = index
+    class Entry(NamedTuple):
+        type: str
+        segment: SEGMENT
+        index: int
 
         def __repr__(self):
             return f'{self.type} {self.segment.value} {self.index}'
 
-    def __init__(self, dumpfile):
+    def __init__(self, dumpfile, parent=None):
         self.data: dict[str, SymbolTable.Entry] = {}
         self.counters = {SEGMENT.THIS: 0, SEGMENT.STATIC: 0, SEGMENT.ARG: 0, SEGMENT.LOCAL: 0}
         self.dumpfile = dumpfile
 
+        # Names visible from this table, including the enclosing table's, so a lookup is a single dict access.
+        # The enclosing table must be complete when this one is reset, which holds for class variables.
+        self.parent = parent
+        self.scope: dict[str, SymbolTable.Entry] = {} if parent is None else dict(parent.scope)
+
     def __repr__(self):
         return f'SymbolTable:\n{'\n'.join([f'{name}: {entry}' for name, entry in self.data.items()])}\n------'
 
@@ -23,6 +29,7 @@ class SymbolTable:
 
     def reset(self):
         self.data.clear()
+        self.scope = {} if self.parent is None else dict(self.parent.scope)
         for segment in self.counters:
             self.counters[segment] = 0
 
@@ -30,7 +37,7 @@ class SymbolTable:
         if segment is SEGMENT.FIELD:
             segment = SEGMENT.THIS
 
-        self.data[name] = SymbolTable.Entry(type, segment, self.counters[segment])
+        self.data[name] = self.scope[name] = SymbolTable.Entry(type, segment, self.counters[segment])
         self.counters[segment] += 1
 
     def defineThisObject(self, type: str):
@@ -42,8 +49,12 @@ class SymbolTable:
 
         return self.counters[segment]
 
-    def getEntry(self, name: str) -> tuple[str, SEGMENT, int]:
-        return self.typeOf(name), self.segmentOf(name), self.indexOf(name)
+    def lookup(self, name: str) -> Entry:
+        # Entry of a name in this table or the enclosing one, None if undefined
+        return self.scope.get(name)
+
+    def getEntry(self, name: str) -> Entry:
+        return self.data[name]
 
     def typeOf(self, name: str) -> str:
         return self.data[name].type
@@ -54,7 +65,14 @@ class SymbolTable:
     def indexOf(self, name: str) -> int:
         return self.data[name].index
 
+    def dumpText(self, tag: str) -> str:
+        return f'{tag}{self}'
+
     def dumpTable(self, tag: str):
+        self.writeDump(self.dumpText(tag))
+
+    def writeDump(self, text: str):
+        # Appends a dump made earlier, e.g. of a subroutine whose output came from the cache
         if self.dumpfile is not None:
             with open(self.dumpfile, 'a') as outfile:
-                print(tag, self, sep='', file=outfile)
+                print(text, file=outfile)
@@ -0,0 +1,160 @@
+from src.VMWriter import VMWriter, formatInstruction, parseInstruction, stripComment
+
+from typing import Iterator
+
+# Binary VM file layout:
+#   magic 'JVMB', version byte
+#   string table:   varint count, then per string varint length and UTF-8 bytes
+#   instructions:   varint count, then per instruction an opcode byte followed by
+#                   push/pop:                 segment byte, varint index
+#                   label/goto/if-goto:       varint string
+#                   function/call:            varint string, varint count
+# Varints are unsigned LEB128: 7 bits per byte, low bits first, high bit set on all but the last byte.
+
+MAGIC = b'JVMB'
+VERSION = 1
+
+OPCODES = (
+    'push', 'pop',
+    'add', 'sub', 'neg', 'eq', 'gt', 'lt', 'and', 'or', 'not',
+    'label', 'goto', 'if-goto',
+    'function', 'call', 'return'
+)
+SEGMENTS = ('argument', 'local', 'static', 'constant', 'this', 'that', 'pointer', 'temp')
+
+OPCODE_LOOKUP = {command: opcode for opcode, command in enumerate(OPCODES)}
+SEGMENT_LOOKUP = {segment: code for code, segment in enumerate(SEGMENTS)}
+
+
+class BytecodeError(Exception):
+    def __init__(self, *args):
+        super().__init__(*args)
+
+
+def _writeVarint(out: bytearray, val: int):
+    while val > 0x7F:
+        out.append(val & 0x7F | 0x80)
+        val >>= 7
+
+    out.append(val)
+
+def _readVarint(data: bytes, pos: int) -> tuple[int, int]:
+    val = 0
+    shift = 0
+
+    while True:
+        byte = data[pos]
+        pos += 1
+        val |= (byte & 0x7F) << shift
+
+        if byte < 0x80:
+            return val, pos
+
+        shift += 7
+
+
+def encode(instructions: list[tuple]) -> bytes:
+    strings = {}
+    body = bytearray()
+
+    def stringIndex(string):
+        return strings.setdefault(string, len(strings))
+
+    for command, *args in instructions:
+        body.append(OPCODE_LOOKUP[command])
+
+        if command in ('push', 'pop'):
+            body.append(SEGMENT_LOOKUP[args[0]])
+            _writeVarint(body, args[1])
+
+        elif command in ('label', 'goto', 'if-goto'):
+            _writeVarint(body, stringIndex(args[0]))
+
+        elif command in ('function', 'call'):
+            _writeVarint(body, stringIndex(args[0]))
+            _writeVarint(body, args[1])
+
+    out = bytearray(MAGIC)
+    out.append(VERSION)
+
+    _writeVarint(out, len(strings))
+    for string in strings:
+        encoded = string.encode()
+        _writeVarint(out, len(encoded))
+        out += encoded
+
+    _writeVarint(out, len(instructions))
+    out += body
+
+    return bytes(out)
+
+def decode(data: bytes) -> Iterator[tuple]:
+    try:
+        yield from _decode(data)
+    except IndexError:
+        raise BytecodeError('Truncated binary VM file') from None
+
+def _decode(data: bytes) -> Iterator[tuple]:
+    if data[:4] != MAGIC:
+        raise BytecodeError('Not a binary VM file')
+    if data[4] != VERSION:
+        raise BytecodeError(f'Unsupported binary VM version: {data[4]}')
+
+    pos = 5
+    strings = []
+
+    nStrings, pos = _readVarint(data, pos)
+    for _ in range(nStrings):
+        length, pos = _readVarint(data, pos)
+        strings.append(data[pos:pos + length].decode())
+        pos += length
+
+    nInstructions, pos = _readVarint(data, pos)
+    for _ in range(nInstructions):
+        command = OPCODES[data[pos]]
+        pos += 1
+
+        if command in ('push', 'pop'):
+            segment = SEGMENTS[data[pos]]
+            index, pos = _readVarint(data, pos + 1)
+            yield command, segment, index
+
+        elif command in ('label', 'goto', 'if-goto'):
+            string, pos = _readVarint(data, pos)
+            yield command, strings[string]
+
+        elif command in ('function', 'call'):
+            string, pos = _readVarint(data, pos)
+            count, pos = _readVarint(data, pos)
+            yield command, strings[string], count
+
+        else:
+            yield command,
+
+
+def readFile(infile: str) -> Iterator[tuple]:
+    # Instructions of a binary or text VM file
+    with open(infile, 'rb') as file:
+        return readContents(file.read())
+
+def readContents(data: bytes) -> Iterator[tuple]:
+    if data.startswith(MAGIC):
+        return decode(data)
+
+    return (parseInstruction(line) for line in data.decode().splitlines() if stripComment(line))
+
+def toText(infile: str, outfile: str):
+    with open(outfile, 'w') as file:
+        for instruction in readFile(infile):
+            print(formatInstruction(instruction), file=file)
+
+def toBinary(infile: str, outfile: str):
+    with open(outfile, 'wb') as file:
+        file.write(encode(list(readFile(infile))))
+
+
+class VMBinaryWriter(VMWriter):
+    '''Writes the compiled instructions in the binary VM format instead of text'''
+
+    def contents(self) -> bytes:
+        return encode(self.instructions)
@@ -1,38 +1,134 @@
 from src.CompilerResources import SEGMENT, COMMAND
 
+import os
+
+# Instructions are kept as tuples of their words, e.g. ('push', 'constant', 7), ('add',) or ('label', 'L0')
+
+def formatInstruction(instruction: tuple) -> str:
+    if instruction[0] in ('label', 'function'):
+        return ' '.join(map(str, instruction))
+
+    return f'\t{' '.join(map(str, instruction))}'
+
+def stripComment(line: str) -> str:
+    # The instruction of a line of VM text without its // comment, '' for blank and comment lines
+    return line.split('//', 1)[0].strip()
+
+def parseInstruction(line: str) -> tuple:
+    command, *args = stripComment(line).split()
+
+    if command in ('push', 'pop', 'function', 'call'):
+        return command, args[0], int(args[1])
+
+    return command, *args
+
+
 class VMWriter:
     def __init__(self, outfile):
-        self.outfile = open(outfile, 'w')
+        self.reset(outfile)
+
+    def reset(self, outfile):
+        # Starts the output of another file
+        self.outfile = outfile
+        self.instructions = []
+        self.lineMarks = []     # (instruction index, source line) where the source line changes
+        self._functionIndex = None
 
     def writePush(self, segment: SEGMENT, index: int):
-        print(f'\tpush {segment.value} {index}', file=self.outfile)
+        self.instructions.append(('push', segment.value, index))
 
     def writePop(self, segment: SEGMENT, index: int):
-        print(f'\tpop {segment.value} {index}', file=self.outfile)
+        self.instructions.append(('pop', segment.value, index))
 
     def writeArithmetic(self, command: COMMAND):
-        print(f'\t{command.value}', file=self.outfile)
+        self.instructions.append((command.value, ))
 
     def writeLabel(self, label: str):
-        print(f'label {label}', file=self.outfile)
+        self.instructions.append(('label', label))
 
     def writeGoto(self, label: str):
-        print(f'\tgoto {label}', file=self.outfile)
+        self.instructions.append(('goto', label))
 
     def writeIf(self, label: str):
-        print(f'\tif-goto {label}', file=self.outfile)
+        self.instructions.append(('if-goto', label))
 
     def writeCall(self, name: str, nArgs: int):
-        print(f'\tcall {name} {nArgs}', file=self.outfile)
+        self.instructions.append(('call', name, nArgs))
 
     def writeFunction(self, name: str, nVars: int):
-        print(f'function {name} {nVars}', file=self.outfile)
+        self._functionIndex = len(self.instructions)
+        self.instructions.append(('function', name, nVars))
+
+    def setLocalCount(self, nVars: int):
+        # Rewrites the header of the function being written, for locals added after it was written
+        _, name, _ = self.instructions[self._functionIndex]
+        self.instructions[self._functionIndex] = ('function', name, nVars)
 
     def writeReturn(self):
-        print('\treturn', file=self.outfile)
+        self.instructions.append(('return', ))
+
+    def writeInstructions(self, instructions: list[tuple], lineMarks=(), firstLine=0):
+        # Copies previously written output, such as a cached subroutine, with its line marks relative to firstLine
+        start = len(self.instructions)
+
+        for index, line in lineMarks:
+            self._markLine(start + index, firstLine + line)
+
+        self.instructions.extend(instructions)
+
+    def takeFrom(self, start: int) -> tuple[list[tuple], list[tuple[int, int]]]:
+        # Removes the instructions from start on, and returns them with their line marks relative to start
+        # so that writeInstructions can write them elsewhere. The line at start stays the current line.
+        taken = self.instructions[start:], self.lineMarksFrom(start, 0)
+
+        del self.instructions[start:]
+        self.lineMarks = [(index, line) for index, line in self.lineMarks if index <= start]
+
+        return taken
+
+    def setLine(self, line: int):
+        # Source line of the instructions written from now on
+        self._markLine(len(self.instructions), line)
+
+    def lineMarksFrom(self, start: int, firstLine: int) -> list[tuple[int, int]]:
+        # Line marks of the instructions from start on, relative to start and firstLine
+        marks = [(index - start, line - firstLine) for index, line in self.lineMarks if index >= start]
+
+        if not marks or marks[0][0] > 0:
+            previous = [line for index, line in self.lineMarks if index < start]
+            if previous:
+                marks.insert(0, (0, previous[-1] - firstLine))
+
+        return marks
+
+    def _markLine(self, index: int, line: int):
+        if self.lineMarks and self.lineMarks[-1][1] == line:
+            return
+
+        if self.lineMarks and self.lineMarks[-1][0] == index:
+            self.lineMarks.pop()    # nothing was written on the previous line
+            if self.lineMarks and self.lineMarks[-1][1] == line:
+                return
+
+        self.lineMarks.append((index, line))
+
+    def contents(self) -> bytes:
+        return ''.join(f'{formatInstruction(instruction)}\n' for instruction in self.instructions).encode()
+
+    def finishLineMarks(self):
+        # Drops the marks of the lines after the last instruction, which wrote nothing
+        while self.lineMarks and self.lineMarks[-1][0] >= len(self.instructions):
+            self.lineMarks.pop()
 
     def close(self):
-        self.outfile.close()
+        self.finishLineMarks()
+        with open(self.outfile, 'wb') as outfile:
+            outfile.write(self.contents())
+
+    def discard(self):
+        # Writes nothing, and removes the output of an earlier compilation so it is not mistaken for current
+        if os.path.exists(self.outfile):
+            os.remove(self.outfile)
 
 
     def writeConstant(self, index: int):
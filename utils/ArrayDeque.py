@@ -1,7 +1,6 @@
-import ctypes
-
 def make_array(n):
-    return (n * ctypes.py_object)()
+    # A fixed size list works as the backing array, without importing ctypes
+    return [None] * n
 
 class ArrayDeque:
     INITIAL_CAPACITY = 8
@@ -15,6 +14,11 @@ class ArrayDeque:
     def __len__(self):
         return self.num_of_elems
 
+    def __getitem__(self, ind):
+        if not 0 <= ind < self.num_of_elems:
+            raise IndexError("Index out of range")
+        return self.data[(self.front_ind + ind) % len(self.data)]
+
     def isEmpty(self):
         return self.num_of_elems == 0
 
@@ -72,6 +76,13 @@ class ArrayDeque:
             self.resize(len(self.data) // 2)
         return value
 
+    def clear(self):
+        # Keeps the capacity for the next fill, dropping the references so the elements can be freed
+        if not self.isEmpty():
+            self.data[:] = make_array(len(self.data))
+        self.num_of_elems = 0
+        self.front_ind = self.back_ind = None
+
     def first(self):
         if self.isEmpty():
             raise Exception("Queue is empty")